@@ -0,0 +1,151 @@
+# attendance.py
+
+from datetime import date
+from sqlalchemy import func, insert, literal_column, update
+from cache import notify_changed
+from models import ATTENDANCE_KEY, Attendance, SchoolStudent, SchoolsGradesSections, db
+
+
+def upsert_insert(model):
+    """The dialect's INSERT, which supports ON CONFLICT, for the session's
+    database, or None when the database has no ON CONFLICT."""
+    dialect = db.session.get_bind(mapper=model.__mapper__).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(model)
+
+
+def _insert_or_update(rows, existing, staff_id, today):
+    """Write marks without ON CONFLICT: one executemany UPDATE by primary key
+    for the students already marked, one INSERT for the rest. A mark
+    inserted by another request in between fails on the unique key
+    instead of being overwritten."""
+    updates = [
+        {
+            "id": existing[student_id].id,
+            "is_present_morning": row["is_present_morning"],
+            "is_present_afternoon": row["is_present_afternoon"],
+            "staff_id": row["staff_id"],
+            "schools_grades_sections_id": row["schools_grades_sections_id"],
+            "updated_by": staff_id,
+            "updated_on": today,
+        }
+        for student_id, row in rows.items() if student_id in existing
+    ]
+    inserts = [row for student_id, row in rows.items() if student_id not in existing]
+    if updates:
+        db.session.execute(update(Attendance), updates)
+    if inserts:
+        db.session.execute(insert(Attendance), inserts)
+
+
+def mark_attendance(school_id, school_grade_section_id, on, marks, staff_id, period=None):
+    """Record a section's marks for one date (and period) with a single upsert
+    (see _insert_or_update for databases without one).
+
+    `marks` is a list of {"student_id", "is_present_morning",
+    "is_present_afternoon"}, the flags being booleans. Students must be
+    enrolled in the section, which must belong to the school. New marks are
+    inserted with created_by set to staff_id; existing ones are overwritten
+    with updated_by set to it.
+
+    Returns one result per mark, in order, with a status of `inserted`,
+    `updated` (another mark existed and differed; its values and who set
+    them are returned as `previous`), `unchanged` or `rejected`.
+    """
+    enrolled = {
+        student_id for student_id, in db.session.query(SchoolStudent.student_id).join(
+            SchoolsGradesSections, SchoolStudent.school_grade_section_id == SchoolsGradesSections.id
+        ).filter(
+            SchoolsGradesSections.id == school_grade_section_id,
+            SchoolsGradesSections.school_id == school_id,
+            SchoolStudent.status.is_(True)
+        )
+    }
+
+    today = date.today()
+    results, rows = [], {}
+    for index, mark in enumerate(marks):
+        mark = mark if isinstance(mark, dict) else {}
+        student_id = mark.get('student_id')
+        present = (mark.get('is_present_morning'), mark.get('is_present_afternoon'))
+        result = {"index": index, "student_id": student_id}
+        # JSON true is an int in Python and "false" a truthy string, so the
+        # types are checked exactly
+        if type(student_id) is not int or student_id not in enrolled:
+            result.update(status="rejected", error="Student is not enrolled in this section")
+        elif not all(isinstance(flag, bool) for flag in present):
+            result.update(status="rejected", error="is_present_morning and is_present_afternoon must be true or false")
+        elif student_id in rows:
+            result.update(status="rejected", error="Student is marked twice")
+        else:
+            rows[student_id] = {
+                "student_id": student_id,
+                "staff_id": staff_id,
+                "schools_grades_sections_id": school_grade_section_id,
+                "attendence_date": on,
+                "period": period,
+                "is_present_morning": present[0],
+                "is_present_afternoon": present[1],
+                "created_by": staff_id,
+                "created_on": today,
+            }
+        results.append(result)
+
+    if rows:
+        existing = {
+            row.student_id: row for row in db.session.query(
+                Attendance.id,
+                Attendance.student_id,
+                Attendance.is_present_morning,
+                Attendance.is_present_afternoon,
+                func.coalesce(Attendance.updated_by, Attendance.created_by).label('marked_by')
+            ).filter(
+                Attendance.student_id.in_(list(rows)),
+                Attendance.attendence_date == on,
+                func.coalesce(Attendance.period, literal_column("''")) == (period or '')
+            )
+        }
+
+        statement = upsert_insert(Attendance)
+        if statement is None:
+            _insert_or_update(rows, existing, staff_id, today)
+        else:
+            statement = statement.values(list(rows.values()))
+            statement = statement.on_conflict_do_update(
+                index_elements=list(ATTENDANCE_KEY),
+                set_={
+                    "is_present_morning": statement.excluded.is_present_morning,
+                    "is_present_afternoon": statement.excluded.is_present_afternoon,
+                    "staff_id": statement.excluded.staff_id,
+                    "schools_grades_sections_id": statement.excluded.schools_grades_sections_id,
+                    "updated_by": staff_id,
+                    "updated_on": today,
+                }
+            )
+            db.session.execute(statement)
+        db.session.commit()
+        # Core statements bypass the session's change tracking
+        notify_changed(Attendance, rows.values())
+
+        for result in results:
+            if "status" in result:
+                continue
+            row, previous = rows[result["student_id"]], existing.get(result["student_id"])
+            if previous is None:
+                result["status"] = "inserted"
+            elif (previous.is_present_morning, previous.is_present_afternoon) == (
+                row["is_present_morning"], row["is_present_afternoon"]
+            ):
+                result["status"] = "unchanged"
+            else:
+                result.update(status="updated", previous={
+                    "is_present_morning": previous.is_present_morning,
+                    "is_present_afternoon": previous.is_present_afternoon,
+                    "marked_by": previous.marked_by,
+                })
+    return results
@@ -0,0 +1,184 @@
+# benchmark.py
+"""Benchmark every API route through the Flask test client.
+
+    python benchmark.py --scale small
+    python benchmark.py --scale large --iterations 50 > bench_output.txt
+
+A synthetic dataset (see seed_data.py) is generated into a fresh SQLite
+file unless DATABASE_URL is set and --no-seed is given. For every endpoint
+the latency percentiles and the most SQL statements issued by a single call
+are reported and compared with BUDGETS; the exit status is 1 when any
+budget is exceeded.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+# Statement budgets are exact upper bounds; latency budgets (p95, ms) leave
+# room for slower machines and only catch gross regressions.
+BUDGETS = {
+    'small': {
+        'login': (4, 400),
+        'student-data': (2, 50),
+        'student-data-batch': (2, 50),
+        'timetable-details': (1, 50),
+        'events': (1, 50),
+        'events-upcoming': (1, 50),
+        'transports': (1, 50),
+        'attendances': (1, 50),
+        'attendance-summary-student': (2, 50),
+        'attendance-summary-section': (6, 100),
+        'userbyid': (2, 50),
+        'user': (2, 50),
+        'exam-schedules': (2, 50),
+        'exam-mark-details': (2, 50),
+        'get-messages': (1, 50),
+        'fees': (1, 50),
+        'report-cards-section': (2, 150),
+        'report-cards-student': (2, 150),
+        'bootstrap': (8, 150),
+        'export-attendance': (5, 500),
+        'export-fees': (2, 100),
+        'export-marks': (2, 300),
+        'permissions': (2, 50),
+        'menu': (1, 50),
+        'fee-dues': (3, 100),
+        'attendance-bulk': (4, 100),
+        'exam-marks-upload': (7, 150),
+    },
+}
+BUDGETS['medium'] = {name: (statements, ms * 2) for name, (statements, ms) in BUDGETS['small'].items()}
+BUDGETS['large'] = {name: (statements, ms * 4) for name, (statements, ms) in BUDGETS['small'].items()}
+# Exports stream a whole school, so their time grows with the dataset rather
+# than with the page sizes the other budgets assume
+for scale, factor in (('medium', 6), ('large', 20)):
+    for name in ('export-attendance', 'export-fees', 'export-marks'):
+        statements, ms = BUDGETS['small'][name]
+        BUDGETS[scale][name] = (statements, ms * factor)
+
+
+def endpoints(token, admin_token):
+    """(name, method, url, request kwargs) for every route, using ids from seed_data."""
+    auth = {'headers': {'Authorization': f'Bearer {token}'}}
+    admin = {'headers': {'Authorization': f'Bearer {admin_token}'}}
+    marks_csv = 'student_id,subject_id,evaluation_type,weightage,marks_obtained,marks_out_of\n' + ''.join(
+        f'{student_id},{subject_id},written,80,{40 + student_id},100\n{student_id},{subject_id},internal,20,15,20\n'
+        for student_id in range(1, 21) for subject_id in range(1, 6)
+    )
+    return [
+        ('login', 'POST', '/api/login', {'json': {'username': 'parent1', 'password': 'password'}}),
+        ('student-data', 'GET', '/api/student-data/1', auth),
+        ('student-data-batch', 'GET', '/api/student-data?ids=1,2,3', auth),
+        ('timetable-details', 'GET', '/api/timetable-details?academic_year_id=1&school_id=1&school_grade_section_id=1', {}),
+        ('events', 'GET', '/api/events/1', {}),
+        ('events-upcoming', 'GET', '/api/events/1?window=upcoming&limit=20', {}),
+        ('transports', 'GET', '/api/transports/1', {}),
+        ('attendances', 'GET', '/api/attendances/1', {}),
+        ('attendance-summary-student', 'GET', '/api/attendance-summary?student_id=1', {}),
+        ('attendance-summary-section', 'GET', '/api/attendance-summary?school_grade_section_id=1', admin),
+        ('userbyid', 'GET', '/api/userbyid/1', {}),
+        ('user', 'GET', '/api/user/1', {}),
+        ('exam-schedules', 'GET', '/api/exam-schedules?grade_id=1', {}),
+        ('exam-mark-details', 'GET', '/api/exam_mark_details?student_id=1&term=Term%201', {}),
+        ('get-messages', 'GET', '/api/get_messages?school_id=1&type=1', {}),
+        ('fees', 'GET', '/api/fees?student_id=1', {}),
+        ('report-cards-section', 'GET', '/api/report-cards?school_grade_section_id=1&term=Term%201', admin),
+        ('report-cards-student', 'GET', '/api/report-cards?term=Term%201', auth),
+        ('bootstrap', 'GET', '/api/bootstrap/1', auth),
+        ('export-attendance', 'GET', '/api/exports/attendance?school_id=1&format=csv', admin),
+        ('export-fees', 'GET', '/api/exports/fees?format=csv', admin),
+        ('export-marks', 'GET', '/api/exports/marks?school_id=1', admin),
+        ('permissions', 'GET', '/api/permissions', admin),
+        ('menu', 'GET', '/api/menu', auth),
+        ('fee-dues', 'GET', '/api/fee-dues?school_id=1', admin),
+        ('attendance-bulk', 'POST', '/api/attendances', dict(admin, json={
+            'school_grade_section_id': 1,
+            'date': date.today().isoformat(),
+            'marks': [{'student_id': id, 'is_present_morning': True, 'is_present_afternoon': id % 5 > 0}
+                      for id in range(1, 21)],
+        })),
+        ('exam-marks-upload', 'POST', '/api/exam-marks/upload?school_grade_section_id=1&term=Term%201',
+         dict(admin, data=marks_csv, content_type='text/csv')),
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=('small', 'medium', 'large'), default='small')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--no-seed', action='store_true', help='use the existing DATABASE_URL data')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        path = os.path.join(tempfile.mkdtemp(prefix='schoople-bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('APP_ENV', 'testing')
+
+    # The app reads its configuration at import time
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from models import db
+    from schoopleapi import app
+    import seed_data
+
+    with app.app_context():
+        if not args.no_seed:
+            db.create_all()
+            seed_data.generate(args.scale)
+
+    statements = [0]
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def count_statement(*_):
+        statements[0] += 1
+
+    client = app.test_client()
+    token = client.post('/api/login', json={'username': 'parent1', 'password': 'password'}).get_json()['token']
+    admin_token = client.post('/api/login', json={'username': 'admin1', 'password': 'password'}).get_json()['token']
+    budgets = BUDGETS[args.scale]
+    failures = []
+
+    print(f"{'endpoint':30} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max sql':>8}")
+    for name, method, url, kwargs in endpoints(token, admin_token):
+        timings, counts, status = [], [], None
+        for _ in range(args.iterations):
+            statements[0] = 0
+            start = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            # Drain streamed bodies so their generators run inside the timing
+            response.get_data()
+            timings.append((time.perf_counter() - start) * 1000)
+            response.close()
+            counts.append(statements[0])
+            status = response.status_code
+
+        p95 = percentile(timings, 95)
+        print(f"{name:30} {status:>6} {percentile(timings, 50):8.2f} {p95:8.2f} "
+              f"{percentile(timings, 99):8.2f} {max(counts):8}")
+
+        if name in budgets:
+            max_statements, max_p95 = budgets[name]
+            if max(counts) > max_statements:
+                failures.append(f"{name}: {max(counts)} SQL statements, budget {max_statements}")
+            if p95 > max_p95:
+                failures.append(f"{name}: p95 {p95:.2f} ms, budget {max_p95} ms")
+        if status >= 500:
+            failures.append(f"{name}: HTTP {status}")
+
+    for failure in failures:
+        print(f"BUDGET EXCEEDED {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
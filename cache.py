@@ -0,0 +1,274 @@
+# cache.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import AcademicYear, Grade, School, Section, Subject, db
+
+# All caches by name, so their counters can be reported in one place
+caches = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """A small thread-safe in-process cache with per-entry expiry and hit/miss counters.
+
+    Holds at most max_entries entries: storing one more evicts the least
+    recently used, so keys chosen by callers cannot grow it without bound.
+    """
+
+    def __init__(self, name, ttl=300, max_entries=1000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Per-key locks of the loads in progress, and a counter bumped by
+        # every invalidation so a load that raced one is not stored
+        self._loading = {}
+        self._generation = 0
+        caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                self._data.move_to_end(key)
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        # Called with the lock held
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value, calling loader() to fill a miss.
+
+        Concurrent misses on the same key wait for a single load rather
+        than each running the loader.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._data.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    return entry[1]
+                generation = self._generation
+            try:
+                value = loader()
+                with self._lock:
+                    if generation == self._generation:
+                        self._store(key, value)
+            finally:
+                with self._lock:
+                    if self._loading.get(key) is key_lock:
+                        del self._loading[key]
+        return value
+
+    def invalidate(self, key=_MISSING):
+        """Drop one key, or everything when no key is given."""
+        with self._lock:
+            self._generation += 1
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drop every key for which predicate(key) is true."""
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+def content_etag(body):
+    """Strong ETag for a response body."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+# A serialized response body kept ready to send, with its ETag and its
+# compressed variants by content encoding, filled in as they are first sent
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'variants'])
+
+
+def cached_response(body):
+    return CachedResponse(body, content_etag(body), {})
+
+
+def cache_stats():
+    """Hit/miss counters for every registered cache."""
+    return {name: c.stats() for name, c in caches.items()}
+
+
+def cache_metrics():
+    """Cache counters as Prometheus exposition lines."""
+    lines = []
+    for metric, help in (('hits', 'Cache hits.'), ('misses', 'Cache misses.')):
+        lines += [f'# HELP cache_{metric}_total {help}', f'# TYPE cache_{metric}_total counter']
+        lines += [f'cache_{metric}_total{{cache="{name}"}} {stats[metric]}' for name, stats in cache_stats().items()]
+    lines += ['# HELP cache_entries Entries currently cached.', '# TYPE cache_entries gauge']
+    lines += [f'cache_entries{{cache="{name}"}} {stats["size"]}' for name, stats in cache_stats().items()]
+    return lines
+
+
+# Change notifications
+#
+# Callbacks registered with on_change() run after a commit that inserted,
+# updated or deleted instances of the given models, and receive the model
+# and a list of {column: value} dicts for the changed rows. Writes that
+# bypass the ORM unit of work (bulk Core statements) should call
+# notify_changed() themselves.
+
+_listeners = defaultdict(list)
+
+
+def on_change(*models):
+    def decorator(fn):
+        for model in models:
+            _listeners[model].append(fn)
+        return fn
+    return decorator
+
+
+def notify_changed(model, rows=()):
+    for fn in _listeners.get(model, ()):
+        fn(model, list(rows))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    # Snapshot the column values now; after the commit the instances are
+    # expired and reading them would emit SQL.
+    changed = session.info.setdefault('changed_rows', defaultdict(list))
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        model = type(obj)
+        if model in _listeners:
+            state = inspect(obj)
+            changed[model].append({
+                attr.key: state.dict[attr.key]
+                for attr in state.mapper.column_attrs if attr.key in state.dict
+            })
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_changes(session):
+    changed = session.info.pop('changed_rows', None)
+    for model, rows in (changed or {}).items():
+        notify_changed(model, rows)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('changed_rows', None)
+
+
+# Reference data
+
+AcademicYearRef = namedtuple('AcademicYearRef', ['id', 'start_date', 'end_date'])
+SchoolRef = namedtuple('SchoolRef', ['id', 'code', 'title'])
+
+
+class ReferenceCache:
+    """Process-wide cache of rarely changing reference data.
+
+    Holds the active academic year, schools and the titles of grades,
+    sections and subjects, keyed by id. Entries expire after
+    REFERENCE_CACHE_TTL seconds and are invalidated when the rows change.
+    """
+
+    titled_models = (Grade, Section, Subject)
+
+    def __init__(self, app=None):
+        self._cache = TTLCache('reference', max_entries=10000)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._cache.ttl = app.config.get('REFERENCE_CACHE_TTL', self._cache.ttl)
+        self._cache.max_entries = app.config.get('REFERENCE_CACHE_MAX_ENTRIES', self._cache.max_entries)
+        app.extensions['reference_cache'] = self
+
+    def active_academic_year(self):
+        def load():
+            year = db.session.query(
+                AcademicYear.id, AcademicYear.start_date, AcademicYear.end_date
+            ).filter(AcademicYear.active.is_(True)).first()
+            return AcademicYearRef(*year) if year else None
+        return self._cache.get_or_load(('academic_years', 'active'), load)
+
+    def school(self, school_id):
+        def load():
+            school = db.session.query(School.id, School.code, School.title).filter(School.id == school_id).first()
+            return SchoolRef(*school) if school else None
+        return self._cache.get_or_load(('schools', school_id), load)
+
+    def titles(self, model, ids):
+        """Return {id: title} for the given ids, loading all misses in one query."""
+        table = model.__tablename__
+        result, missing = {}, []
+        for id in set(ids):
+            if id is None:
+                continue
+            title = self._cache.get((table, id), _MISSING)
+            if title is _MISSING:
+                missing.append(id)
+            else:
+                result[id] = title
+        if missing:
+            for id, title in db.session.query(model.id, model.title).filter(model.id.in_(missing)):
+                self._cache.set((table, id), title)
+                result[id] = title
+        return result
+
+    def invalidate(self, model=None, id=None):
+        """Drop cached reference data; with no arguments the whole cache is cleared."""
+        if model is None:
+            self._cache.invalidate()
+            return
+        table = model.__tablename__
+        if model is AcademicYear:
+            self._cache.invalidate((table, 'active'))
+        if id is not None:
+            self._cache.invalidate((table, id))
+        else:
+            self._cache.invalidate_where(lambda key: key[0] == table)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+reference = ReferenceCache()
+
+
+@on_change(AcademicYear, School, *ReferenceCache.titled_models)
+def _invalidate_reference(model, rows):
+    if not rows:
+        reference.invalidate(model)
+    for row in rows:
+        reference.invalidate(model, id=row.get('id'))
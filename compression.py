@@ -0,0 +1,122 @@
+# compression.py
+
+import gzip
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Preferred first when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/csv', 'text/plain', 'application/x-ndjson')
+
+
+def compress(body, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(body, quality=config['COMPRESS_BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel=config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+
+def compress_stream(chunks, encoding, config):
+    """Compress an iterable of byte chunks incrementally."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+        compress_chunk, finish = compressor.process, compressor.finish
+    else:
+        # wbits 31 selects the gzip container
+        compressor = zlib.compressobj(config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+        compress_chunk, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            data = compress_chunk(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def variant_etag(etag, encoding):
+    """Each encoding of a body is a different representation and gets its own ETag."""
+    return f"{etag}-{encoding}"
+
+
+def etag_variants(etag):
+    return [etag] + [variant_etag(etag, encoding) for encoding in ENCODINGS]
+
+
+def negotiate():
+    """Pick the best encoding the client accepts, or None."""
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    for encoding in ENCODINGS:
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class Compression:
+    """Compresses responses with brotli or gzip, as negotiated through
+    Accept-Encoding, once they reach COMPRESS_MIN_SIZE bytes.
+
+    Streamed responses, whose size is not known up front, are compressed
+    chunk by chunk as they are sent. Responses that already have a
+    Content-Encoding are left alone. A response may carry a
+    `compressed_variants` dict (see cache.CachedResponse); compressed bodies
+    are then taken from it, or stored in it, so a cached body is only
+    compressed once per encoding.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.config = app.config
+        app.after_request(self._compress_response)
+        app.extensions['compression'] = self
+
+    def _compress_response(self, response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if (
+            response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+        ):
+            return response
+        streamed = response.is_streamed
+        if not streamed and response.content_length < self.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        encoding = negotiate()
+        if encoding is None:
+            return response
+
+        if streamed:
+            response.response = compress_stream(response.response, encoding, self.config)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+            return response
+
+        variants = getattr(response, 'compressed_variants', None)
+        body = variants.get(encoding) if variants is not None else None
+        if body is None:
+            body = compress(response.get_data(), encoding, self.config)
+            if variants is not None:
+                variants[encoding] = body
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(variant_etag(etag, encoding), weak=weak)
+        return response
@@ -0,0 +1,137 @@
+# exam_marks.py
+
+import csv
+import math
+from sqlalchemy import delete, insert, select, tuple_
+from cache import notify_changed
+from models import ExamMarkDetails, ExamMarks, SchoolStudent, SchoolsGradesSections, Subject, db
+
+MARK_COLUMNS = ('student_id', 'subject_id', 'evaluation_type', 'weightage', 'marks_obtained', 'marks_out_of')
+
+# Validation stops collecting errors after this many
+MAX_REPORTED_ERRORS = 100
+
+
+class MarksUploadError(Exception):
+    """The upload was rejected; `errors` lists the problems by CSV line."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+def _parse_mark(row, enrolled, subjects):
+    """Validate one CSV row and return its typed values."""
+    try:
+        student_id = int(row['student_id'])
+        subject_id = int(row['subject_id'])
+        weightage = float(row['weightage'])
+        obtained = float(row['marks_obtained'])
+        out_of = float(row['marks_out_of'])
+    except (TypeError, ValueError):
+        raise ValueError("student_id and subject_id must be integers and the marks numbers")
+    if not all(math.isfinite(value) for value in (weightage, obtained, out_of)):
+        raise ValueError("Marks must be finite numbers")
+    evaluation_type = (row['evaluation_type'] or '').strip()
+    if student_id not in enrolled:
+        raise ValueError(f"Student {student_id} is not enrolled in this section")
+    if subject_id not in subjects:
+        raise ValueError(f"Subject {subject_id} does not belong to this school")
+    if not evaluation_type or len(evaluation_type) > 50:
+        raise ValueError("evaluation_type must be 1 to 50 characters")
+    if out_of <= 0 or weightage < 0 or not 0 <= obtained <= out_of:
+        raise ValueError("Marks must be between 0 and marks_out_of, which must be positive")
+    return student_id, subject_id, evaluation_type, weightage, obtained, out_of
+
+
+def ingest_exam_marks(school_id, school_grade_section_id, term, staff_id, lines, max_rows):
+    """Load a section's marks for a term from CSV lines in one transaction.
+
+    The CSV has a header row with MARK_COLUMNS; each row is one evaluation
+    of one student in one subject. Rows are checked against the section's
+    enrolled students and the school's subjects, loaded once up front, and
+    nothing is written unless every row is valid (MarksUploadError lists
+    the problems). The term's existing marks for each uploaded (student,
+    subject) are replaced, and no others: one ExamMarks header is inserted
+    per (student, subject), with the ids returned by the same batched
+    INSERT, then all ExamMarkDetails in one executemany.
+
+    Returns counts of the headers and details written.
+    """
+    enrolled = set(db.session.scalars(
+        select(SchoolStudent.student_id).join(
+            SchoolsGradesSections, SchoolStudent.school_grade_section_id == SchoolsGradesSections.id
+        ).where(
+            SchoolsGradesSections.id == school_grade_section_id,
+            SchoolsGradesSections.school_id == school_id
+        )
+    ))
+    subjects = set(db.session.scalars(select(Subject.id).where(Subject.school_id == school_id)))
+
+    reader = csv.DictReader(lines)
+    missing = [column for column in MARK_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise MarksUploadError([{"line": 1, "error": f"Missing columns: {', '.join(missing)}"}])
+
+    # (student, subject) -> {evaluation_type: [weightage, obtained, out of]}
+    marks, errors, rows = {}, [], 0
+    for row in reader:
+        rows += 1
+        if rows > max_rows:
+            raise MarksUploadError([{"line": reader.line_num, "error": f"At most {max_rows} rows per upload"}])
+        try:
+            student_id, subject_id, evaluation_type, *values = _parse_mark(row, enrolled, subjects)
+            evaluations = marks.setdefault((student_id, subject_id), {})
+            if evaluation_type in evaluations:
+                raise ValueError(f"Duplicate {evaluation_type} mark for student {student_id}, subject {subject_id}")
+            evaluations[evaluation_type] = values
+        except ValueError as e:
+            errors.append({"line": reader.line_num, "error": str(e)})
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                break
+    if errors:
+        raise MarksUploadError(errors)
+    if not marks:
+        raise MarksUploadError([{"line": 1, "error": "The upload has no rows"}])
+
+    replaced = select(ExamMarks.id).where(
+        ExamMarks.term == term,
+        tuple_(ExamMarks.student_id, ExamMarks.subject_id).in_(list(marks))
+    )
+    try:
+        db.session.execute(delete(ExamMarkDetails).where(ExamMarkDetails.exam_mark_id.in_(replaced)))
+        db.session.execute(delete(ExamMarks).where(ExamMarks.id.in_(replaced)))
+
+        headers = [
+            {"term": term, "student_id": student_id, "subject_id": subject_id, "staff_id": staff_id}
+            for student_id, subject_id in marks
+        ]
+        # Each (student, subject) has one header, so the returned rows map
+        # back without asking for them in parameter order, which would stop
+        # some backends from batching the INSERT
+        header_ids = {
+            (student_id, subject_id): id for id, student_id, subject_id in db.session.execute(
+                insert(ExamMarks).returning(ExamMarks.id, ExamMarks.student_id, ExamMarks.subject_id), headers
+            )
+        }
+
+        details = [
+            {
+                "exam_mark_id": header_ids[key],
+                "evaluation_type": evaluation_type,
+                "weightage": weightage,
+                "marks_obtained": obtained,
+                "marks_out_of": out_of,
+            }
+            for key, evaluations in marks.items()
+            for evaluation_type, (weightage, obtained, out_of) in evaluations.items()
+        ]
+        db.session.execute(insert(ExamMarkDetails), details)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Core statements bypass the session's change tracking
+    notify_changed(ExamMarks, headers)
+    return {"exam_marks": len(headers), "exam_mark_details": len(details)}
@@ -0,0 +1,128 @@
+# exports.py
+
+import csv
+import io
+import orjson
+from sqlalchemy import select
+from models import (
+    Attendance, ExamMarkDetails, ExamMarks, Fee, FeeType, SchoolStudent, SchoolsGradesSections, Subject, db
+)
+from serialization import orjson_default
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _enrolled_students(school_id, academic_year_id):
+    return select(SchoolStudent.student_id).join(
+        SchoolsGradesSections, SchoolStudent.school_grade_section_id == SchoolsGradesSections.id
+    ).where(
+        SchoolsGradesSections.school_id == school_id,
+        SchoolStudent.academic_year_id == academic_year_id
+    )
+
+
+def attendance_export(school_id, academic_year_id):
+    return select(
+        Attendance.id,
+        Attendance.student_id,
+        Attendance.schools_grades_sections_id,
+        Attendance.attendence_date,
+        Attendance.period,
+        Attendance.is_present_morning,
+        Attendance.is_present_afternoon,
+        Attendance.staff_id,
+    ).join(
+        SchoolsGradesSections, Attendance.schools_grades_sections_id == SchoolsGradesSections.id
+    ).where(
+        SchoolsGradesSections.school_id == school_id,
+        SchoolsGradesSections.academic_year_id == academic_year_id
+    ).order_by(Attendance.id)
+
+
+def fee_export(school_id, academic_year_id):
+    return select(
+        Fee.id,
+        Fee.student_id,
+        Fee.fee_type_id,
+        FeeType.title.label('fee_type'),
+        Fee.actual_fee,
+        Fee.discount_percentage,
+        Fee.fine_percentage,
+        Fee.paid_amount,
+        Fee.payment_date,
+    ).join(
+        FeeType, Fee.fee_type_id == FeeType.id
+    ).where(
+        FeeType.school_id == school_id,
+        Fee.student_id.in_(_enrolled_students(school_id, academic_year_id))
+    ).order_by(Fee.id)
+
+
+def marks_export(school_id, academic_year_id):
+    return select(
+        ExamMarkDetails.id,
+        ExamMarks.id.label('exam_mark_id'),
+        ExamMarks.student_id,
+        ExamMarks.term,
+        ExamMarks.subject_id,
+        Subject.title.label('subject'),
+        ExamMarkDetails.evaluation_type,
+        ExamMarkDetails.weightage,
+        ExamMarkDetails.marks_obtained,
+        ExamMarkDetails.marks_out_of,
+    ).join(
+        ExamMarkDetails, ExamMarks.id == ExamMarkDetails.exam_mark_id
+    ).join(
+        Subject, ExamMarks.subject_id == Subject.id
+    ).where(
+        Subject.school_id == school_id,
+        ExamMarks.student_id.in_(_enrolled_students(school_id, academic_year_id))
+    ).order_by(ExamMarks.id, ExamMarkDetails.id)
+
+
+EXPORTS = {
+    'attendance': attendance_export,
+    'fees': fee_export,
+    'marks': marks_export,
+}
+
+
+def export_rows(statement, batch_size):
+    """Yield lists of row mappings, batch_size rows at a time.
+
+    yield_per makes the driver use a server-side cursor where it has one
+    (psycopg2's named cursors), so only one batch is held in memory.
+    """
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        for batch in result.mappings().partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def encode_ndjson(columns, batches):
+    for batch in batches:
+        yield b''.join(
+            orjson.dumps(dict(row), default=orjson_default, option=orjson.OPT_APPEND_NEWLINE) for row in batch
+        )
+
+
+def encode_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        for row in batch:
+            writer.writerow([
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in (row[column] for column in columns)
+            ])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
@@ -0,0 +1,128 @@
+# hashing.py
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+
+def _hash_prefix(method):
+    """The "method:params" prefix werkzeug writes for hashes made with `method`,
+    with its default parameters filled in (e.g. "scrypt" -> "scrypt:32768:8:1")."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = args or (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f"Invalid hash method '{method}'.")
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full, a hash did not finish in time or
+    the pool had to be restarted."""
+
+
+class PasswordHasher:
+    """Runs password hashing on a dedicated, bounded process pool.
+
+    Hashing is deliberately CPU-heavy, so keeping it off the request workers
+    lets hashing capacity be sized separately from API capacity. Submissions
+    beyond PASSWORD_HASH_MAX_PENDING fail fast with HashingBusy instead of
+    queueing behind each other.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'scrypt'
+        self.workers = 2
+        self.max_pending = 16
+        self.timeout = 5
+        self._executor = None
+        self._executor_pid = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._prefix = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._prefix = None
+        app.extensions['password_hasher'] = self
+
+    def _get_executor(self):
+        # The pool is created lazily and per process, so forking servers
+        # (e.g. gunicorn with preload) do not share a pool across workers.
+        # Its workers are started by a forkserver (or spawned) rather than
+        # forked from this multithreaded process, whose locks another
+        # thread may hold at the time of the fork.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _discard_executor(self, executor):
+        """Drop a broken pool (e.g. a worker was OOM-killed); the next
+        submission starts a new one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy("Too many pending password hashes")
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard_executor(executor)
+            raise HashingBusy("Password hashing pool was restarted")
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy("Password hashing timed out")
+        except BrokenProcessPool:
+            self._discard_executor(executor)
+            raise HashingBusy("Password hashing pool was restarted")
+
+    def hash(self, password):
+        """Hash a password with the configured method and work factor."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        """Check a password against a stored hash."""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Return True when a stored hash uses outdated parameters."""
+        if self._prefix is None:
+            self._prefix = _hash_prefix(self.method)
+        return pwhash.split('$', 1)[0] != self._prefix
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+hasher = PasswordHasher()
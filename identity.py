@@ -0,0 +1,133 @@
+# identity.py
+
+from functools import wraps
+from flask import request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from cache import TTLCache, on_change
+from models import SchoolSubscription, User, UserRole, db
+
+# Claims copied into access tokens at login. Endpoints read the caller's
+# context from them instead of looking the user up again.
+CONTEXT_CLAIMS = (
+    'student_id', 'staff_id', 'school_id', 'school_grade_section_id', 'academic_year_id',
+    'school_subscription_id', 'role_ids'
+)
+
+
+class IdentityCache:
+    """Token claims for a user, and a short-lived cache of whether users are
+    still active.
+
+    Registered as the JWTManager's blocklist loader: a token is refused once
+    its user is deactivated or deleted. The check is answered from memory
+    and goes to the database at most once per user every IDENTITY_CACHE_TTL
+    seconds, or sooner when the user row changes.
+    """
+
+    def __init__(self, app=None, jwt=None):
+        self._active = TTLCache('identity', ttl=60)
+        if app is not None:
+            self.init_app(app, jwt)
+
+    def init_app(self, app, jwt):
+        self._active.ttl = app.config.get('IDENTITY_CACHE_TTL', self._active.ttl)
+        jwt.token_in_blocklist_loader(self._token_revoked)
+        on_change(User)(self._invalidate)
+        app.extensions['identity_cache'] = self
+
+    def is_active(self, user_id):
+        def load():
+            return bool(db.session.query(User.id).filter(User.id == user_id, User.is_active.is_(True)).first())
+        return self._active.get_or_load(user_id, load)
+
+    def _token_revoked(self, jwt_header, jwt_payload):
+        return not self.is_active(int(jwt_payload['sub']))
+
+    def _invalidate(self, model, rows):
+        for row in rows:
+            self._active.invalidate(row.get('id'))
+
+    def claims(self, user, profile=None):
+        """Additional claims for a user's access token.
+
+        `profile` is the student's StudentProfile, when the user is a parent.
+        """
+        claims = dict.fromkeys(CONTEXT_CLAIMS)
+        claims['student_id'] = user.student_id
+        claims['staff_id'] = user.staff_id
+        claims['role_ids'] = [
+            role_id for role_id, in db.session.query(UserRole.role_id).filter(UserRole.user_id == user.id)
+        ]
+        if profile is not None and profile.grade_section is not None:
+            claims['school_id'] = profile.grade_section.school_id
+            claims['school_grade_section_id'] = profile.grade_section.id
+            claims['academic_year_id'] = profile.grade_section.academic_year_id
+        elif user.staff is not None:
+            claims['school_id'] = user.staff.school_id
+
+        if claims['school_id'] is not None:
+            query = db.session.query(SchoolSubscription.id).filter(
+                SchoolSubscription.school_id == claims['school_id'], SchoolSubscription.status.is_(True)
+            )
+            if claims['academic_year_id'] is not None:
+                query = query.filter(SchoolSubscription.academic_year_id == claims['academic_year_id'])
+            claims['school_subscription_id'] = query.order_by(SchoolSubscription.id.desc()).limit(1).scalar()
+        return claims
+
+    def stats(self):
+        return self._active.stats()
+
+
+identity = IdentityCache()
+
+
+def identity_optional(view):
+    """Read the caller's token, when one is sent, for a view anonymous
+    callers may use as well.
+
+    Unlike jwt_required(optional=True), a token that is expired, malformed
+    or revoked does not fail the request; the caller is served as anonymous.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            verify_jwt_in_request(optional=True)
+        except (JWTExtendedException, PyJWTError):
+            pass
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def caller_claims():
+    """The verified token's claims, or {} for an anonymous caller."""
+    try:
+        return get_jwt()
+    except RuntimeError:
+        # No token was verified in this request
+        return {}
+
+
+class ContextMismatch(Exception):
+    """A query parameter names another student or school than the caller's
+    token does, and the caller may not see it."""
+
+
+def context_arg(name, allowed=None):
+    """The caller's context value: the int query parameter, or their token's
+    claim when the parameter is not given.
+
+    An authenticated caller asking for a value other than their claim gets
+    ContextMismatch, unless `allowed(claim, value)` says they may see it
+    (e.g. a parent asking for a sibling). Anonymous callers of the public
+    views (see identity_optional) have no claims, so the parameter is used
+    as it is.
+    """
+    claim = caller_claims().get(name)
+    value = request.args.get(name, type=int)
+    if value is None:
+        return claim
+    if claim is not None and value != claim and not (allowed and allowed(claim, value)):
+        raise ContextMismatch(name)
+    return value
@@ -0,0 +1,189 @@
+# metrics.py
+
+import bisect
+import logging
+import threading
+import time
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+# All metrics in registration order, rendered by render_prometheus()
+registry = []
+
+# Functions returning extra exposition lines, e.g. cache counters
+collectors = []
+
+slow_query_log = logging.getLogger('schoople.slow_query')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class Histogram:
+    """A Prometheus-style histogram with optional labels."""
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_format_labels(key + (("le", bound),))} {cumulative}')
+                lines.append(f'{self.name}_bucket{_format_labels(key + (("le", "+Inf"),))} {series["count"]}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {series["sum"]}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {series["count"]}')
+        return lines
+
+
+def render_prometheus():
+    """Render every registered metric in the Prometheus text format."""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    for collect in collectors:
+        lines.extend(collect())
+    return '\n'.join(lines) + '\n'
+
+
+pool_checkout_seconds = Histogram(
+    'db_pool_checkout_seconds',
+    'Time spent waiting to check a connection out of the pool.'
+)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_seconds.observe(time.perf_counter() - start)
+
+
+request_duration_seconds = Histogram(
+    'http_request_duration_seconds', 'Request latency by route.', labelnames=('route', 'method')
+)
+request_sql_statements = Histogram(
+    'http_request_sql_statements', 'SQL statements issued per request.', COUNT_BUCKETS, labelnames=('route',)
+)
+request_db_seconds = Histogram(
+    'http_request_db_seconds', 'Time spent executing SQL per request.', labelnames=('route',)
+)
+response_serialize_seconds = Histogram(
+    'http_response_serialize_seconds', 'Time spent serializing JSON per request.', labelnames=('route',)
+)
+
+
+def current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+
+class RequestMetrics:
+    """Records per-route latency, SQL statement count, DB time and JSON
+    serialization time, and logs statements slower than SLOW_QUERY_MS."""
+
+    def __init__(self, app=None):
+        self.slow_query_seconds = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 0) / 1000
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.extensions['request_metrics'] = self
+
+    def _start_request(self):
+        start_counting()
+
+    def _finish_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = current_route()
+            request_duration_seconds.observe(time.perf_counter() - start, route=route, method=request.method)
+            request_sql_statements.observe(g.metrics_sql_statements, route=route)
+            request_db_seconds.observe(g.metrics_db_seconds, route=route)
+            response_serialize_seconds.observe(g.metrics_serialize_seconds, route=route)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Statements on one connection never nest, so a single start time is
+        # enough, and a failed statement's is simply overwritten by the next.
+        conn.info['metrics_query_start'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop('metrics_query_start')
+        if has_app_context() and 'metrics_start' in g:
+            g.metrics_sql_statements += 1
+            g.metrics_db_seconds += elapsed
+        if self.slow_query_seconds and elapsed >= self.slow_query_seconds:
+            slow_query_log.warning("%.1f ms on %s: %s", elapsed * 1000, current_route(), statement)
+
+
+# Per-request counters kept on g while a request (or work done for it) runs
+COUNTERS = ('metrics_sql_statements', 'metrics_db_seconds', 'metrics_serialize_seconds')
+
+
+def start_counting():
+    """Count SQL and serialization in the current app context.
+
+    Called for every request, and by work a request hands to another thread
+    under its own app context, whose counts are then passed back with
+    counters() and add_counters().
+    """
+    g.metrics_start = time.perf_counter()
+    for name in COUNTERS:
+        setattr(g, name, 0)
+
+
+def counters():
+    return {name: g.get(name, 0) for name in COUNTERS}
+
+
+def add_counters(counts):
+    if has_app_context() and 'metrics_start' in g:
+        for name, value in counts.items():
+            setattr(g, name, getattr(g, name) + value)
+
+
+def record_serialization(seconds):
+    if has_app_context() and 'metrics_start' in g:
+        g.metrics_serialize_seconds += seconds
+
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-db = SQLAlchemy()
+from hashing import hasher
+from routing import RoutingSession
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Subscription(db.Model):
     __tablename__ = 'subscriptions'
@@ -52,7 +53,7 @@ class User(db.Model):
     roles = db.relationship('Role', secondary='user_roles', backref='users')
     def set_password(self, raw_password):
         """Hash and set the user's password."""
-        self.password = generate_password_hash(raw_password)
+        self.password = hasher.hash(raw_password)
 
 
 class UserRole(db.Model):
@@ -385,6 +386,9 @@ class StaffsGrades(db.Model):
     )
 class ExamMarks(db.Model):
     __tablename__ = 'exam_marks'
+    __table_args__ = (
+        db.Index('ix_exam_marks_student_id_term', 'student_id', 'term'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     term = db.Column(db.String(50), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -393,6 +397,9 @@ class ExamMarks(db.Model):
 
 class ExamMarkDetails(db.Model):
     __tablename__ = 'exam_mark_details'
+    __table_args__ = (
+        db.Index('ix_exam_mark_details_exam_mark_id', 'exam_mark_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     exam_mark_id = db.Column(db.Integer, db.ForeignKey('exam_marks.id'), nullable=False)
     evaluation_type = db.Column(db.String(50), nullable=False)
@@ -405,6 +412,9 @@ class ExamMarkDetails(db.Model):
     
 class Attendance(db.Model):
     __tablename__ = 'attendances'
+    __table_args__ = (
+        db.Index('ix_attendances_student_id_attendence_date', 'student_id', 'attendence_date', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -431,6 +441,15 @@ class Attendance(db.Model):
     def __repr__(self):
         return f"<Attendance(id={self.id}, student_id={self.student_id}, staff_id={self.staff_id}, attendence_date={self.attendence_date})>"
 
+# One mark per student, date and period. Daily marks have no period, and
+# NULLs never conflict in a unique index, so the period is coalesced.
+ATTENDANCE_KEY = (
+    Attendance.student_id,
+    Attendance.attendence_date,
+    db.func.coalesce(Attendance.period, db.literal_column("''")),
+)
+db.Index('uq_attendances_student_id_date_period', *ATTENDANCE_KEY, unique=True)
+
 class TimeTable(db.Model):
     __tablename__ = 'time_tables'
 
@@ -472,6 +491,9 @@ class TimeTableDetails(db.Model):
 
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        db.Index('ix_events_school_id_date', 'school_id', 'date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     school_id = db.Column(db.Integer, nullable=False)
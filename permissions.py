@@ -0,0 +1,184 @@
+# permissions.py
+
+from collections import defaultdict
+from functools import wraps
+from flask import jsonify
+from flask_jwt_extended import get_jwt, jwt_required
+from sqlalchemy import exists, literal, select
+from sqlalchemy.orm import aliased
+from cache import TTLCache, on_change
+from models import Module, Permission, Role, SchoolSubscriptionModuleRolePermission, db
+
+# Guards the menu query against a parent_id cycle
+MENU_MAX_DEPTH = 10
+
+MENU_COLUMNS = ('id', 'parent_id', 'module_name', 'menu_name', 'module_link', 'priority')
+
+
+class PermissionMatrix:
+    """What each role may do in each module, per school subscription.
+
+    Every active permission is given one bit. A subscription's matrix maps
+    (role_id, module_id) to the OR of the granted bits and is built with one
+    query the first time it is needed; a check is then a dict lookup and a
+    bit test. The app menu each set of roles may see is cached alongside.
+    Both are invalidated when permission rows change and expire after
+    PERMISSION_CACHE_TTL seconds.
+    """
+
+    def __init__(self, app=None):
+        self._cache = TTLCache('permissions', ttl=600)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._cache.ttl = app.config.get('PERMISSION_CACHE_TTL', self._cache.ttl)
+        on_change(SchoolSubscriptionModuleRolePermission)(self._invalidate_subscriptions)
+        on_change(Module, Permission, Role)(self._invalidate_all)
+        app.extensions['permission_matrix'] = self
+
+    def catalog(self):
+        """({module_name: module_id}, {permission_id: bit}, {permission_name: bit})"""
+        def load():
+            modules = dict(db.session.query(Module.module_name, Module.id).filter(Module.is_active.is_(True)))
+            permission_rows = db.session.query(Permission.id, Permission.permission_name).filter(
+                Permission.is_active.is_(True)
+            ).order_by(Permission.id).all()
+            bits = {id: 1 << position for position, (id, _) in enumerate(permission_rows)}
+            named_bits = {name: bits[id] for id, name in permission_rows}
+            return modules, bits, named_bits
+        return self._cache.get_or_load('catalog', load)
+
+    def matrix(self, school_subscription_id):
+        """{(role_id, module_id): granted bits} for one school subscription."""
+        def load():
+            _, bits, _ = self.catalog()
+            rows = db.session.query(
+                SchoolSubscriptionModuleRolePermission.role_id,
+                SchoolSubscriptionModuleRolePermission.module_id,
+                SchoolSubscriptionModuleRolePermission.permission_id
+            ).join(
+                Role, SchoolSubscriptionModuleRolePermission.role_id == Role.id
+            ).filter(
+                SchoolSubscriptionModuleRolePermission.school_subscription_id == school_subscription_id,
+                Role.is_active.is_(True)
+            )
+            masks = defaultdict(int)
+            for role_id, module_id, permission_id in rows:
+                masks[(role_id, module_id)] |= bits.get(permission_id, 0)
+            return dict(masks)
+        return self._cache.get_or_load(('matrix', school_subscription_id), load)
+
+    def allowed(self, school_subscription_id, role_ids, module_name, permission_name):
+        if school_subscription_id is None:
+            return False
+        modules, _, named_bits = self.catalog()
+        module_id = modules.get(module_name)
+        bit = named_bits.get(permission_name)
+        if module_id is None or bit is None:
+            return False
+        matrix = self.matrix(school_subscription_id)
+        return any(matrix.get((role_id, module_id), 0) & bit for role_id in role_ids)
+
+    def granted(self, school_subscription_id, role_ids):
+        """{module_name: [permission names]} the roles hold together."""
+        if school_subscription_id is None:
+            return {}
+        modules, _, named_bits = self.catalog()
+        matrix = self.matrix(school_subscription_id)
+        result = {}
+        for module_name, module_id in modules.items():
+            mask = 0
+            for role_id in role_ids:
+                mask |= matrix.get((role_id, module_id), 0)
+            if mask:
+                result[module_name] = sorted(name for name, bit in named_bits.items() if mask & bit)
+        return result
+
+    def menu(self, school_subscription_id, role_ids):
+        """The app menu tree the roles may see, cached per (subscription, roles).
+
+        A module is shown when it is active, visible in the app and one of
+        the roles holds any permission on it; a hidden module hides its
+        whole subtree. Siblings are ordered by priority.
+        """
+        role_ids = tuple(sorted(set(role_ids)))
+        if school_subscription_id is None or not role_ids:
+            return []
+        return self._cache.get_or_load(
+            ('menu', school_subscription_id, role_ids), lambda: self._load_menu(school_subscription_id, role_ids)
+        )
+
+    def _load_menu(self, school_subscription_id, role_ids):
+        grant = SchoolSubscriptionModuleRolePermission
+
+        def shown(module):
+            return (
+                module.is_active.is_(True),
+                module.is_visible_in_app.is_(True),
+                exists().where(
+                    grant.module_id == module.id,
+                    grant.school_subscription_id == school_subscription_id,
+                    grant.role_id.in_(role_ids),
+                    grant.role_id == Role.id,
+                    Role.is_active.is_(True)
+                ),
+            )
+
+        # The whole hierarchy in one recursive CTE: the shown root modules,
+        # then level by level the shown children of modules already found
+        tree = select(
+            *(getattr(Module, column) for column in MENU_COLUMNS), literal(0).label('depth')
+        ).where(Module.parent_id.is_(None), *shown(Module)).cte('menu_tree', recursive=True)
+        child = aliased(Module)
+        tree = tree.union_all(
+            select(*(getattr(child, column) for column in MENU_COLUMNS), tree.c.depth + 1)
+            .join(tree, child.parent_id == tree.c.id)
+            .where(tree.c.depth < MENU_MAX_DEPTH, *shown(child))
+        )
+        rows = db.session.execute(
+            select(tree).order_by(tree.c.priority.is_(None), tree.c.priority, tree.c.id)
+        ).mappings().all()
+
+        nodes = {row['id']: dict(((column, row[column]) for column in MENU_COLUMNS), children=[]) for row in rows}
+        roots = []
+        for row in rows:
+            node = nodes[row['id']]
+            if row['parent_id'] is None:
+                roots.append(node)
+            elif row['parent_id'] in nodes:
+                nodes[row['parent_id']]['children'].append(node)
+        return roots
+
+    def _invalidate_subscriptions(self, model, rows):
+        subscription_ids = {row.get('school_subscription_id') for row in rows}
+        if None in subscription_ids:
+            self._invalidate_all(model, rows)
+        # Matrix and menu keys are ('matrix' or 'menu', subscription id, ...)
+        self._cache.invalidate_where(lambda key: isinstance(key, tuple) and key[1] in subscription_ids)
+
+    def _invalidate_all(self, model, rows):
+        self._cache.invalidate()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+permissions = PermissionMatrix()
+
+
+def permission_required(module_name, permission_name):
+    """Allow the view only to callers whose token roles hold the permission
+    on the module under their school subscription (see identity.claims)."""
+    def decorator(view):
+        @wraps(view)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            claims = get_jwt()
+            if not permissions.allowed(
+                claims.get('school_subscription_id'), claims.get('role_ids') or (), module_name, permission_name
+            ):
+                return jsonify({"error": "You do not have permission to do this."}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,372 @@
+# reports.py
+
+import statistics
+from collections import defaultdict
+from sqlalchemy import and_, case, extract, func
+from models import (
+    Attendance, ExamMarkDetails, ExamMarks, Fee, FeeType, SchoolFee, SchoolStudent, SchoolsGradesSections, Student,
+    Subject, db
+)
+from cache import reference
+
+ATTENDANCE_COUNTS = ('days', 'present_morning', 'present_afternoon', 'present_fullday')
+
+
+def _attendance_totals(counts):
+    totals = dict(counts)
+    # Each day has a morning and an afternoon session
+    sessions = 2 * counts['days']
+    totals['attendance_percentage'] = (
+        round((counts['present_morning'] + counts['present_afternoon']) * 100 / sessions, 2)
+        if sessions else None
+    )
+    return totals
+
+
+def attendance_summary(student_id=None, school_grade_section_id=None, date_from=None, date_to=None, terms=None):
+    """Aggregate attendance per month, per term and overall.
+
+    Works for one student or a whole grade-section; for a grade-section the
+    per-student totals are included as well. The counting is done with a
+    single GROUP BY (student, year, month) query and the much smaller month
+    rows are folded into terms and totals here. `terms` maps a term name to
+    the month numbers it covers.
+
+    Days are counted by date, so a day marked per period counts once; a
+    session counts as attended when any of the day's marks has it present,
+    and the full day when one of its marks has both.
+    """
+    day = Attendance.attendence_date
+    year = extract('year', day)
+    month = extract('month', day)
+    morning = Attendance.is_present_morning.is_(True)
+    afternoon = Attendance.is_present_afternoon.is_(True)
+
+    query = db.session.query(
+        Attendance.student_id,
+        year.label('year'),
+        month.label('month'),
+        func.count(day.distinct()).label('days'),
+        func.count(case((morning, day)).distinct()).label('present_morning'),
+        func.count(case((afternoon, day)).distinct()).label('present_afternoon'),
+        func.count(case((and_(morning, afternoon), day)).distinct()).label('present_fullday'),
+    )
+    if student_id is not None:
+        query = query.filter(Attendance.student_id == student_id)
+    if school_grade_section_id is not None:
+        query = query.filter(Attendance.schools_grades_sections_id == school_grade_section_id)
+    if date_from:
+        query = query.filter(Attendance.attendence_date >= date_from)
+    if date_to:
+        query = query.filter(Attendance.attendence_date <= date_to)
+
+    rows = query.group_by(Attendance.student_id, year, month).all()
+
+    term_of_month = {m: name for name, months in (terms or {}).items() for m in months}
+    zero = dict.fromkeys(ATTENDANCE_COUNTS, 0)
+    overall = dict(zero)
+    by_month = defaultdict(lambda: dict(zero))
+    by_term = defaultdict(lambda: dict(zero))
+    by_student = defaultdict(lambda: dict(zero))
+
+    for row in rows:
+        key = (int(row.year), int(row.month))
+        buckets = [overall, by_month[key], by_student[row.student_id]]
+        if key[1] in term_of_month:
+            buckets.append(by_term[term_of_month[key[1]]])
+        for bucket in buckets:
+            for name in ATTENDANCE_COUNTS:
+                bucket[name] += int(getattr(row, name) or 0)
+
+    summary = {
+        "totals": _attendance_totals(overall),
+        "months": [
+            {"year": y, "month": m, **_attendance_totals(by_month[(y, m)])}
+            for y, m in sorted(by_month)
+        ],
+        "terms": [
+            {"term": name, **_attendance_totals(by_term[name])}
+            for name in (terms or {}) if name in by_term
+        ],
+    }
+    if school_grade_section_id is not None:
+        summary["students"] = [
+            {"student_id": sid, **_attendance_totals(by_student[sid])}
+            for sid in sorted(by_student)
+        ]
+    return summary
+
+
+# Score bands (lower bound inclusive) for the per-subject distributions
+SCORE_BANDS = ((0, '0-35'), (35, '35-50'), (50, '50-60'), (60, '60-75'), (75, '75-90'), (90, '90-100'))
+
+
+def _band(percentage):
+    label = SCORE_BANDS[0][1]
+    for lower, name in SCORE_BANDS:
+        if percentage >= lower:
+            label = name
+    return label
+
+
+def _ranks(scores):
+    """Competition ranks (1, 2, 2, 4) for {key: score}, highest score first."""
+    ranks, previous, rank = {}, None, 0
+    for position, (key, score) in enumerate(sorted(scores.items(), key=lambda item: -item[1]), start=1):
+        if score != previous:
+            rank, previous = position, score
+        ranks[key] = rank
+    return ranks
+
+
+def build_report_card(school_grade_section_id, term):
+    """Compute report cards for every student of a grade-section in one term.
+
+    All marks are loaded with a single query. Each subject's percentage is
+    the weightage-weighted average of its evaluations (marks obtained over
+    marks out of); a student's percentage is the mean of their subject
+    percentages. Returns the class view: per-student subject scores, totals
+    and ranks, plus per-subject statistics and score distributions.
+    """
+    rows = db.session.query(
+        ExamMarks.student_id,
+        ExamMarks.subject_id,
+        ExamMarkDetails.weightage,
+        ExamMarkDetails.marks_obtained,
+        ExamMarkDetails.marks_out_of,
+        Student.first_name,
+        Student.last_name
+    ).join(
+        ExamMarkDetails, ExamMarks.id == ExamMarkDetails.exam_mark_id
+    ).join(
+        SchoolStudent, and_(
+            SchoolStudent.student_id == ExamMarks.student_id,
+            SchoolStudent.school_grade_section_id == school_grade_section_id
+        )
+    ).join(
+        Student, Student.id == ExamMarks.student_id
+    ).filter(
+        ExamMarks.term == term
+    ).all()
+
+    # (student, subject) -> [weighted score, weightage, obtained, out of]
+    sums = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0])
+    names = {}
+    for row in rows:
+        acc = sums[(row.student_id, row.subject_id)]
+        if row.marks_out_of:
+            acc[0] += row.weightage * row.marks_obtained / row.marks_out_of
+        acc[1] += row.weightage
+        acc[2] += row.marks_obtained
+        acc[3] += row.marks_out_of
+        names[row.student_id] = f"{row.first_name} {row.last_name}"
+
+    subject_titles = reference.titles(Subject, {subject_id for _, subject_id in sums})
+    student_subjects = defaultdict(dict)
+    subject_scores = defaultdict(dict)
+    for (student_id, subject_id), (weighted, weightage, obtained, out_of) in sums.items():
+        percentage = round(weighted * 100 / weightage, 2) if weightage else 0.0
+        student_subjects[student_id][subject_id] = {
+            "subject_id": subject_id,
+            "subject_title": subject_titles.get(subject_id),
+            "marks_obtained": obtained,
+            "marks_out_of": out_of,
+            "percentage": percentage,
+        }
+        subject_scores[subject_id][student_id] = percentage
+
+    percentages = {
+        student_id: round(statistics.fmean(s["percentage"] for s in subjects.values()), 2)
+        for student_id, subjects in student_subjects.items()
+    }
+    ranks = _ranks(percentages)
+    subject_ranks = {subject_id: _ranks(scores) for subject_id, scores in subject_scores.items()}
+
+    students = []
+    for student_id in sorted(student_subjects, key=lambda sid: (ranks[sid], sid)):
+        subjects = student_subjects[student_id]
+        students.append({
+            "student_id": student_id,
+            "name": names[student_id],
+            "subjects": [
+                dict(subjects[subject_id], rank=subject_ranks[subject_id][student_id])
+                for subject_id in sorted(subjects)
+            ],
+            "weighted_total": round(sum(s["percentage"] for s in subjects.values()), 2),
+            "max_total": 100 * len(subjects),
+            "percentage": percentages[student_id],
+            "rank": ranks[student_id],
+        })
+
+    subject_statistics = []
+    for subject_id in sorted(subject_scores):
+        scores = list(subject_scores[subject_id].values())
+        distribution = dict.fromkeys((name for _, name in SCORE_BANDS), 0)
+        for score in scores:
+            distribution[_band(score)] += 1
+        subject_statistics.append({
+            "subject_id": subject_id,
+            "subject_title": subject_titles.get(subject_id),
+            "students": len(scores),
+            "average": round(statistics.fmean(scores), 2),
+            "median": round(statistics.median(scores), 2),
+            "min": min(scores),
+            "max": max(scores),
+            "std_dev": round(statistics.pstdev(scores), 2),
+            "distribution": distribution,
+        })
+
+    return {
+        "school_grade_section_id": school_grade_section_id,
+        "term": term,
+        "class_average": round(statistics.fmean(percentages.values()), 2) if percentages else None,
+        "students": students,
+        "subjects": subject_statistics,
+    }
+
+
+def student_report_card(report_card, student_id):
+    """Slice one student's report card, with class context, out of a class view."""
+    student = next((s for s in report_card["students"] if s["student_id"] == student_id), None)
+    if student is None:
+        return None
+    return dict(
+        student,
+        term=report_card["term"],
+        class_size=len(report_card["students"]),
+        class_average=report_card["class_average"],
+        subject_averages=[
+            {"subject_id": s["subject_id"], "average": s["average"]} for s in report_card["subjects"]
+        ],
+    )
+
+
+def _fee_due(amount, schedule, discount_percentage, fine_percentage, on):
+    """What a fee costs when paid on the given date under its SchoolFee deadlines.
+
+    Up to the deduction deadline the discount applies, up to the plain
+    deadline the full amount is due, and after that the fine is added. The
+    fine deadline is the last day to pay with the fine; a fee paid after it
+    still owes the same fine (a schedule has a single fine percentage) but
+    is overdue. Returns (due, discount, fine, overdue).
+    """
+    if schedule is not None:
+        if schedule.fee_payment_last_date_with_deduction and on <= schedule.fee_payment_last_date_with_deduction:
+            discount = amount * (discount_percentage or 0) / 100
+            return amount - discount, discount, 0, False
+        last_plain_date = schedule.fee_payment_last_date_without_deduction
+        if last_plain_date and on > last_plain_date:
+            fine = amount * (fine_percentage or 0) / 100
+            last_fine_date = schedule.fee_payment_last_date_with_fine
+            return amount + fine, 0, fine, bool(last_fine_date and on > last_fine_date)
+    return amount, 0, 0, False
+
+
+def fee_dues(school_id, academic_year_id, as_of, student_id=None):
+    """Outstanding fee balances for a school's students as of a date.
+
+    Loads the fees of every student enrolled in the school that year with
+    their fee types in one query, and the fee types' SchoolFee schedules in
+    another. A fee's own discount and fine percentages override the
+    schedule's. A fee counts as settled when its paid amount covered what
+    was due on its payment date; otherwise its balance is what is due on
+    `as_of` less what has been paid, and is also counted as `overdue` when
+    `as_of` is past the fine deadline. Returns totals overall, per fee type
+    and per student with dues.
+    """
+    enrolled = db.session.query(SchoolStudent.student_id).join(
+        SchoolsGradesSections, SchoolStudent.school_grade_section_id == SchoolsGradesSections.id
+    ).filter(
+        SchoolsGradesSections.school_id == school_id,
+        SchoolStudent.academic_year_id == academic_year_id
+    )
+    if student_id is not None:
+        enrolled = enrolled.filter(SchoolStudent.student_id == student_id)
+
+    fees = db.session.query(
+        Fee.student_id,
+        Fee.fee_type_id,
+        FeeType.title.label('fee_type'),
+        Fee.actual_fee,
+        Fee.discount_percentage,
+        Fee.fine_percentage,
+        Fee.paid_amount,
+        Fee.payment_date,
+    ).join(
+        FeeType, Fee.fee_type_id == FeeType.id
+    ).filter(
+        FeeType.school_id == school_id,
+        Fee.student_id.in_(enrolled.scalar_subquery())
+    ).all()
+
+    # One schedule per fee type; the latest wins if several were defined
+    schedules = {}
+    for schedule in db.session.query(SchoolFee).join(
+        FeeType, SchoolFee.fee_type_id == FeeType.id
+    ).filter(
+        FeeType.school_id == school_id,
+        SchoolFee.academic_year_id == academic_year_id
+    ).order_by(SchoolFee.id):
+        schedules[schedule.fee_type_id] = schedule
+
+    zero = dict.fromkeys(('due', 'discount', 'fine', 'paid', 'balance', 'overdue'), 0)
+    overall = dict(zero)
+    by_fee_type = defaultdict(lambda: dict(zero))
+    students_with_dues = defaultdict(set)
+    students_overdue = defaultdict(set)
+    by_student = defaultdict(lambda: dict(zero))
+    fee_type_titles = {}
+
+    for fee in fees:
+        schedule = schedules.get(fee.fee_type_id)
+        discount_percentage = fee.discount_percentage if fee.discount_percentage is not None else (
+            schedule.discount_percentage if schedule else None)
+        fine_percentage = fee.fine_percentage if fee.fine_percentage is not None else (
+            schedule.fine_percentage if schedule else None)
+
+        settled = False
+        if fee.payment_date:
+            due, discount, fine, overdue = _fee_due(fee.actual_fee, schedule, discount_percentage,
+                                                    fine_percentage, fee.payment_date)
+            settled = fee.paid_amount >= due
+        if not settled:
+            due, discount, fine, overdue = _fee_due(fee.actual_fee, schedule, discount_percentage,
+                                                    fine_percentage, as_of)
+        balance = max(due - fee.paid_amount, 0)
+
+        fee_type_titles[fee.fee_type_id] = fee.fee_type
+        line = {
+            'due': due, 'discount': discount, 'fine': fine, 'paid': fee.paid_amount, 'balance': balance,
+            'overdue': balance if overdue else 0,
+        }
+        for bucket in (overall, by_fee_type[fee.fee_type_id], by_student[fee.student_id]):
+            for name, value in line.items():
+                bucket[name] += value
+        if balance:
+            students_with_dues[fee.fee_type_id].add(fee.student_id)
+            if overdue:
+                students_overdue[fee.fee_type_id].add(fee.student_id)
+
+    def rounded(totals):
+        return {name: round(value, 2) for name, value in totals.items()}
+
+    return {
+        "school_id": school_id,
+        "academic_year_id": academic_year_id,
+        "as_of": as_of,
+        "totals": rounded(overall),
+        "fee_types": [
+            {
+                "fee_type_id": fee_type_id,
+                "fee_type": fee_type_titles[fee_type_id],
+                **rounded(by_fee_type[fee_type_id]),
+                "students_with_dues": len(students_with_dues[fee_type_id]),
+                "students_overdue": len(students_overdue[fee_type_id]),
+            }
+            for fee_type_id in sorted(by_fee_type)
+        ],
+        "students": [
+            {"student_id": sid, **rounded(by_student[sid])}
+            for sid in sorted(by_student) if by_student[sid]['balance']
+        ],
+    }
@@ -0,0 +1,65 @@
+# routing.py
+
+import itertools
+import threading
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+_round_robin = itertools.count()
+_round_robin_lock = threading.Lock()
+
+
+def replica_binds(replica_uris, options_for):
+    """SQLALCHEMY_BINDS entries for the given replica URIs."""
+    return {
+        f'{REPLICA_BIND_PREFIX}{i}': {'url': uri, **options_for(uri)}
+        for i, uri in enumerate(replica_uris)
+    }
+
+
+def use_primary(view):
+    """Mark a read-only view as needing the primary, e.g. for read-after-write."""
+    view.use_primary = True
+    return view
+
+
+def _pick_replica(engines):
+    replicas = [engines[key] for key in sorted(k for k in engines if k and k.startswith(REPLICA_BIND_PREFIX))]
+    if not replicas:
+        return None
+    if current_app.config.get('DB_REPLICA_STRATEGY') == 'least_loaded':
+        return min(replicas, key=lambda engine: getattr(engine.pool, 'checkedout', lambda: 0)())
+    with _round_robin_lock:
+        return replicas[next(_round_robin) % len(replicas)]
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica when the current request allows it.
+
+    Requests are marked read-only by setting g.db_read_replica (see
+    schoopleapi.route_reads_to_replica). Flushes, Core INSERT/UPDATE/DELETE
+    statements and anything after the first write in a request always go
+    to the primary. One replica is picked per request so all of its reads
+    see the same replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            replica = g.get('db_replica')
+            if replica is None:
+                replica = g.db_replica = _pick_replica(self._db.engines)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if not has_app_context() or not g.get('db_read_replica'):
+            return False
+        if self._flushing or isinstance(clause, sa.UpdateBase):
+            # Keep the rest of the request on the primary so it reads its own writes
+            g.db_read_replica = False
+            return False
+        return True
@@ -1,22 +1,40 @@
-from datetime import datetime, timedelta
+import io
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
 import email
 from email import message
 from pyexpat.errors import messages
 from unittest import result
-from flask import Flask, request, jsonify, session
+from flask import Flask, g, request, jsonify, session, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, case, or_
+from sqlalchemy.orm import aliased
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager, create_access_token, get_jwt_identity, jwt_required
-from models import AcademicYear, Attendance, Event, ExamMarkDetails, ExamMarks, ExamSchedule, Fee, FeeType, GeneralMessage, Grade, Role, School, SchoolStudent, SchoolsGradesSections, Section, Subject, TimeTable, TimeTableDetails, Transport, UserRole, db, User, Student
+from flask_jwt_extended import JWTManager, create_access_token, get_jwt, jwt_required
+from models import Attendance, Event, ExamMarkDetails, ExamMarks, ExamSchedule, Fee, FeeType, GeneralMessage, Grade, Role, SchoolStudent, SchoolsGradesSections, Section, Staff, Subject, TimeTable, TimeTableDetails, Transport, UserRole, db, User, Student
 from config import DevelopmentConfig, TestingConfig, ProductionConfig
-from werkzeug.security import check_password_hash
+from hashing import hasher, HashingBusy
+from identity import ContextMismatch, context_arg, identity, identity_optional
+from permissions import permission_required, permissions
+from routing import use_primary
+from cache import TTLCache, cache_metrics, cache_stats, cached_response, content_etag, on_change, reference
+from reports import attendance_summary, build_report_card, fee_dues, student_report_card
+from attendance import mark_attendance
+from exam_marks import MarksUploadError, ingest_exam_marks
+from exports import EXPORTS, EXPORT_FORMATS, encode_csv, encode_ndjson, export_rows
+from metrics import RequestMetrics, add_counters, collectors, counters, render_prometheus, start_counting
+from compression import Compression, etag_variants
+from serialization import ORJSONProvider
 from flask_cors import CORS
 app = Flask(__name__)
-CORS(app)
+app.json = ORJSONProvider(app)
+CORS(app, expose_headers=['ETag', 'X-Next-Cursor'])
 app.config['JWT_SECRET_KEY'] = 'a6r2iLt8P7$%@!>98uQ/!h2FwXs'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=30)
-# Choose the configuration based on an environment variable or hardcoded value
-env = 'development'  # Change to 'testing' or 'production' as needed
+# Choose the configuration with the APP_ENV environment variable
+env = os.environ.get('APP_ENV', 'development')  # 'development', 'testing' or 'production'
 
 if env == 'development':
     app.config.from_object(DevelopmentConfig)
@@ -27,43 +45,149 @@ elif env == 'production':
 
 db.init_app(app)
 jwt = JWTManager(app)
+hasher.init_app(app)
+reference.init_app(app)
+identity.init_app(app, jwt)
+permissions.init_app(app)
+request_metrics = RequestMetrics(app)
+compression = Compression(app)
+collectors.append(cache_metrics)
+
+@app.before_request
+def route_reads_to_replica():
+    """Let GET/HEAD requests read from a replica, unless the view is marked
+    with routing.use_primary or the client sends X-Read-Primary: 1."""
+    view = app.view_functions.get(request.endpoint)
+    g.db_read_replica = (
+        request.method in ('GET', 'HEAD')
+        and not getattr(view, 'use_primary', False)
+        and request.headers.get('X-Read-Primary') != '1'
+    )
 
-# Login Endpoint
-@app.route('/api/login', methods=['POST'])
-def login():
-    """Handle user login and return student data with a JWT token."""
-    data = request.json
-    username = data.get('username')
-    password = data.get('password')
 
-    # Check for user existence
-    user = User.query.filter_by(username=username, is_active=True).first()
-    if not user or not check_password_hash(user.password, password):
-        return jsonify({"error": "Invalid username or password"}), 401
+@app.errorhandler(ContextMismatch)
+def context_mismatch(error):
+    """A caller asked for another student's or school's data by query
+    parameter; see identity.context_arg."""
+    return jsonify({"error": f"This {error.args[0]} does not belong to this user."}), 403
+
+
+def not_modified(etag):
+    """Return a 304 response when the request's If-None-Match matches etag,
+    or the ETag of one of its compressed variants."""
+    if request.method in ('GET', 'HEAD'):
+        for candidate in etag_variants(etag):
+            if request.if_none_match.contains(candidate):
+                response = app.response_class(status=304)
+                response.set_etag(candidate)
+                return response
+    return None
+
+
+def etag_response(body, etag=None, status=200, variants=None):
+    """Send a JSON body with a strong ETag, answering If-None-Match with 304.
+
+    `variants` is where compressed copies of a cached body are kept.
+    """
+    etag = etag or content_etag(body)
+    response = not_modified(etag)
+    if response is None:
+        response = app.response_class(body, status=status, mimetype='application/json')
+        response.set_etag(etag)
+        response.compressed_variants = variants
+    return response
+
+
+def cached_etag_response(cached):
+    return etag_response(cached.body, cached.etag, variants=cached.variants)
+
+
+StudentProfile = namedtuple(
+    'StudentProfile',
+    ['student', 'school_student', 'grade_section', 'grade', 'section', 'school', 'academic_year']
+)
+
+
+def load_student_profiles(student_ids):
+    """Load students with their current grade/section enrolment in a single
+    joined query, and resolve grade, section, school and the active academic
+    year from the reference cache. Returns {student_id: StudentProfile}."""
+    active_academic_year = reference.active_academic_year()
+    active_academic_year_id = active_academic_year.id if active_academic_year else None
+
+    rows = (
+        db.session.query(Student, SchoolStudent, SchoolsGradesSections)
+        .outerjoin(SchoolStudent, SchoolStudent.student_id == Student.id)
+        .outerjoin(SchoolsGradesSections, SchoolsGradesSections.id == SchoolStudent.school_grade_section_id)
+        .filter(Student.id.in_(student_ids))
+        # Prefer the enrolment for the active academic year, then the latest one
+        .order_by(
+            Student.id,
+            case((SchoolStudent.academic_year_id == active_academic_year_id, 0), else_=1),
+            SchoolStudent.id.desc()
+        )
+        .all()
+    )
 
-    # Retrieve student details
-    student = Student.query.filter_by(id=user.student_id).first()
-    if not student:
-        return jsonify({"error": "No student data available for this user."}), 404
+    current = {}
+    for student, school_student, grade_section in rows:
+        current.setdefault(student.id, (student, school_student, grade_section))
+
+    grade_sections = [grade_section for _, _, grade_section in current.values() if grade_section]
+    grades = reference.titles(Grade, [gs.grade_id for gs in grade_sections])
+    sections = reference.titles(Section, [gs.section_id for gs in grade_sections])
+
+    return {
+        student.id: StudentProfile(
+            student=student,
+            school_student=school_student,
+            grade_section=grade_section,
+            grade=grades.get(grade_section.grade_id) if grade_section else None,
+            section=sections.get(grade_section.section_id) if grade_section else None,
+            school=reference.school(grade_section.school_id) if grade_section else None,
+            academic_year=active_academic_year,
+        )
+        for student, school_student, grade_section in current.values()
+    }
 
-    # Get school_student and grade/section details
-    school_student = SchoolStudent.query.filter_by(student_id=student.id).first()
-    grade_section = (
-        SchoolsGradesSections.query.filter_by(id=school_student.school_grade_section_id).first()
-        if school_student else None
+
+def load_student_profile(student_id):
+    """Load one student's profile; see load_student_profiles. Returns a
+    StudentProfile or None."""
+    return load_student_profiles([student_id]).get(student_id)
+
+
+PARENT_CONTACTS = ('father_mobile', 'mother_mobile', 'father_email', 'mother_email')
+
+
+def is_sibling(student, other):
+    """True when two students share a parent's mobile number or email."""
+    contacts = {getattr(student, field) for field in PARENT_CONTACTS} - {None, ''}
+    return any(getattr(other, field) in contacts for field in PARENT_CONTACTS)
+
+
+def are_siblings(student_id, other_id):
+    """True when both students exist and are siblings; the `allowed` check
+    of context_arg('student_id', allowed=are_siblings)."""
+    students = {student.id: student for student in Student.query.filter(Student.id.in_({student_id, other_id}))}
+    return (
+        student_id in students and other_id in students
+        and is_sibling(students[student_id], students[other_id])
     )
 
-    grade = grade_section.grade.title if grade_section and grade_section.grade else None
-    section = grade_section.section.title if grade_section and grade_section.section else None
-    active_academic_year = AcademicYear.query.filter_by(active=True).first()
 
-    # Student response data
+def student_profile_data(profile, detailed=False):
+    """Build the student response data from a loaded StudentProfile."""
+    student = profile.student
+    grade_section = profile.grade_section
+    active_academic_year = profile.academic_year
+
     student_data = {
         "school_id": grade_section.school_id,
-        "school_code": grade_section.school.title,
-        "school_name": grade_section.school.code,
+        "school_code": profile.school.title,
+        "school_name": profile.school.code,
         "school_grade_section_id": grade_section.id,
-        "active_academic_year_id":active_academic_year.id,
+        "active_academic_year_id": active_academic_year.id,
         "student_id": student.id,
         "first_name": student.first_name,
         "last_name": student.last_name,
@@ -74,10 +198,10 @@ def login():
         "student_code": student.student_code,
         "father_name": student.father_name,
         "mother_name": student.mother_name,
-        "grade": grade,
-	    "grade_id": grade_section.grade_id,
-        "section": section,
-	    "section_id": grade_section.section_id,
+        "grade": profile.grade,
+        "grade_id": grade_section.grade_id,
+        "section": profile.section,
+        "section_id": grade_section.section_id,
         "aadhar_number": student.aadhar_number,
         "permanent_address": student.permanent_address,
         "communication_address": student.communication_address,
@@ -91,97 +215,134 @@ def login():
         "gender": student.gender,
     }
 
-    # Create a token
-    token = create_access_token(identity=str(user.id))
+    if detailed:
+        student_data.update({
+            "active_academic_year_start": active_academic_year.start_date.strftime('%Y'),
+            "active_academic_year_end": active_academic_year.end_date.strftime('%Y'),
+            "father_mobile": student.father_mobile,
+            "mother_mobile": student.mother_mobile,
+        })
+
+    return student_data
+
+# Login Endpoint
+@app.route('/api/login', methods=['POST'])
+def login():
+    """Handle user login and return student data with a JWT token."""
+    data = request.json
+    username = data.get('username')
+    password = data.get('password')
+
+    # Check for user existence
+    user = User.query.filter_by(username=username, is_active=True).first()
+    try:
+        if not user or not hasher.check(user.password, password):
+            return jsonify({"error": "Invalid username or password"}), 401
+
+        # Transparently upgrade hashes made with outdated parameters
+        if hasher.needs_rehash(user.password):
+            user.password = hasher.hash(password)
+            db.session.commit()
+    except HashingBusy:
+        return jsonify({"error": "Login is busy, please try again."}), 503, {"Retry-After": "1"}
+
+    # Staff accounts (e.g. school admins) have no student profile
+    if user.student_id is None and user.staff_id is not None:
+        profile, student_data = None, None
+    else:
+        # Retrieve student, grade/section, school and academic year details
+        profile = load_student_profile(user.student_id)
+        if not profile or not profile.grade_section:
+            return jsonify({"error": "No student data available for this user."}), 404
+
+        student_data = student_profile_data(profile)
+
+    # Create a token carrying the student's context, so later requests can
+    # use it without looking the user up again
+    token = create_access_token(identity=str(user.id), additional_claims=identity.claims(user, profile))
 
     return jsonify({"token": token, "student_data": student_data}), 200
 
 @app.route('/api/student-data/<int:id>', methods=['GET'])
 @jwt_required()
 def get_student_data(id):
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    
-
-
-    student = Student.query.filter_by(id=id).first()
-    if not student:
+    # The token's user has been checked by the identity blocklist loader
+    profile = load_student_profile(id)
+    if not profile or not profile.grade_section:
         return jsonify({"error": "No student data available for this user."}), 404
 
-    # Get school_student and grade/section details
-    school_student = SchoolStudent.query.filter_by(student_id=student.id).first()
-    grade_section = (
-        SchoolsGradesSections.query.filter_by(id=school_student.school_grade_section_id).first()
-        if school_student else None
-    )
-
-    grade = grade_section.grade.title if grade_section and grade_section.grade else None
-    section = grade_section.section.title if grade_section and grade_section.section else None
-    active_academic_year = AcademicYear.query.filter_by(active=True).first()
-    # Student response data
-    student_data = {
-        "school_id": grade_section.school_id,
-        "school_code": grade_section.school.title,
-        "school_name": grade_section.school.code,
-        "school_grade_section_id": grade_section.id,
-        "active_academic_year_id":active_academic_year.id,
-	"active_academic_year_start":active_academic_year.start_date.strftime('%Y'),
-	"active_academic_year_end":active_academic_year.end_date.strftime('%Y'),
-        "student_id": student.id,
-        "first_name": student.first_name,
-        "last_name": student.last_name,
-        "middle_name": student.middle_name,
-        "dob": student.dob.strftime('%d-%m-%Y'),
-        "photo": student.photo,
-        "admission_number": student.admission_number,
-        "student_code": student.student_code,
-        "father_name": student.father_name,
-        "mother_name": student.mother_name,
-        "grade": grade,
-	"grade_id": grade_section.grade_id,
-        "section": section,
-	"section_id": grade_section.section_id,
-        "aadhar_number": student.aadhar_number,
-        "permanent_address": student.permanent_address,
-        "communication_address": student.communication_address,
-        "hobbies": student.hobbies,
-        "father_email": student.father_email,
-        "mother_email": student.mother_email,
-        "annual_income": student.annual_income,
-        "blood_group": student.blood_group,
-        "status": student.status,
-        "nationality": student.nationality,
-        "gender": student.gender,  
-        "father_mobile": student.father_mobile,
-        "mother_mobile": student.mother_mobile,        
-    }
+    student_data = student_profile_data(profile, detailed=True)
 
     return jsonify({"student_data": student_data}), 200
 
-@app.route('/api/timetable-details', methods=['GET'])
-def get_timetable_details():
-    # Fetch query parameters
-    academic_year_id = request.args.get('academic_year_id')
-    school_id = request.args.get('school_id')
-    school_grade_section_id = request.args.get('school_grade_section_id')
-
-    if not (academic_year_id and school_id and school_grade_section_id):
-        return jsonify({"error": "Missing required query parameters"}), 400
-
-    # Query the timetable and related details
-    timetable = TimeTable.query.filter_by(
-        school_id=school_id,
-        academic_year_id=academic_year_id,
-        schools_grades_sections_id=school_grade_section_id
-    ).first()
-
-    if not timetable:
-        return jsonify([])  # Return an empty list if no timetable exists
+@app.route('/api/student-data', methods=['GET'])
+@jwt_required()
+def get_students_data():
+    """Profiles for several of the caller's children at once, e.g.
+    ?ids=12,13. Resolved with a constant number of queries however many
+    children are asked for; returns the profiles keyed by student id."""
+    try:
+        student_ids = {int(id) for id in request.args.get('ids', '').split(',') if id.strip()}
+    except ValueError:
+        return jsonify({"error": "ids must be a comma-separated list of student ids"}), 400
+    if not student_ids:
+        return jsonify({"error": "ids is required"}), 400
+    if len(student_ids) > app.config['STUDENT_BATCH_LIMIT']:
+        return jsonify({"error": f"At most {app.config['STUDENT_BATCH_LIMIT']} students per request"}), 400
+
+    own_id = get_jwt().get('student_id')
+    profiles = load_student_profiles(student_ids | {own_id} if own_id else student_ids)
+    own = profiles.get(own_id)
+
+    students, errors = {}, {}
+    for student_id in sorted(student_ids):
+        profile = profiles.get(student_id)
+        if not profile or not profile.grade_section:
+            errors[student_id] = "No student data available."
+        elif not own or (student_id != own.student.id and not is_sibling(own.student, profile.student)):
+            errors[student_id] = "Student does not belong to this user."
+        else:
+            students[student_id] = student_profile_data(profile, detailed=True)
+
+    return jsonify({"students": students, "errors": errors}), 200
+
+
+timetable_cache = TTLCache(
+    'timetable', ttl=app.config['TIMETABLE_CACHE_TTL'], max_entries=app.config['TIMETABLE_CACHE_MAX_ENTRIES']
+)
+
+
+def build_timetable(school_id, academic_year_id, school_grade_section_id):
+    """Render a grade-section's weekly timetable with one joined query.
+    Returns a CachedResponse holding the JSON body and its ETag."""
+    timetable_id = (
+        db.session.query(TimeTable.id)
+        .filter_by(
+            school_id=school_id,
+            academic_year_id=academic_year_id,
+            schools_grades_sections_id=school_grade_section_id
+        )
+        .order_by(TimeTable.id)
+        .limit(1)
+        .scalar_subquery()
+    )
 
-    # Fetch timetable details
-    details = TimeTableDetails.query.filter_by(time_table_id=timetable.id).order_by(TimeTableDetails.order_number.asc()).all()
+    details = db.session.query(
+        TimeTableDetails.day_name,
+        TimeTableDetails.order_number,
+        TimeTableDetails.time_slot,
+        Subject.title.label('subject'),
+        Staff.first_name.label('staff_first_name'),
+        Staff.last_name.label('staff_last_name')
+    ).outerjoin(
+        Subject, TimeTableDetails.subject_id == Subject.id
+    ).outerjoin(
+        Staff, TimeTableDetails.staff_id == Staff.id
+    ).filter(
+        TimeTableDetails.time_table_id == timetable_id
+    ).order_by(
+        TimeTableDetails.order_number.asc()
+    ).all()
 
     # Format response
     response_data = [
@@ -189,81 +350,391 @@ def get_timetable_details():
             "day_name": detail.day_name,
             "order_number": detail.order_number,
             "time_slot": detail.time_slot,
-            "subject": detail.subject.title if detail.subject else "N/A",
-            "staff": f"{detail.staff.first_name} {detail.staff.last_name}" if detail.staff else "N/A"
+            "subject": detail.subject or "N/A",
+            "staff": f"{detail.staff_first_name} {detail.staff_last_name}" if detail.staff_first_name else "N/A"
         }
         for detail in details
     ]
 
-    return jsonify(response_data), 200
+    return cached_response(app.json.dumpb(response_data))
 
-@app.route('/api/events/<int:school_id>', methods=['GET'])
-def get_event_data(school_id):
 
-    events = Event.query.filter_by(school_id=school_id).order_by(getattr(Event,"date").desc()).all()
-    if not events:
-        return jsonify({"error": "No events available."}), 404
-    
-    response_data = [
+@on_change(TimeTable)
+def _invalidate_timetable(model, rows):
+    for row in rows:
+        timetable_cache.invalidate((row.get('school_id'), row.get('academic_year_id'), row.get('schools_grades_sections_id')))
+
+
+@on_change(TimeTableDetails, Subject, Staff)
+def _invalidate_all_timetables(model, rows):
+    # Detail, subject and staff rows do not carry the timetable key, and
+    # they change rarely enough that dropping every timetable is cheap.
+    timetable_cache.invalidate()
+
+
+@app.route('/api/timetable-details', methods=['GET'])
+@identity_optional
+def get_timetable_details():
+    # The caller's own grade-section, or the query parameters when anonymous
+    academic_year_id = context_arg('academic_year_id')
+    school_id = context_arg('school_id')
+    school_grade_section_id = context_arg('school_grade_section_id')
+
+    if None in (academic_year_id, school_id, school_grade_section_id):
+        return jsonify({"error": "Missing required query parameters"}), 400
+
+    # Every student in a section gets the same timetable, so the rendered
+    # body is built once and shared
+    cached = timetable_cache.get_or_load(
+        (school_id, academic_year_id, school_grade_section_id),
+        lambda: build_timetable(school_id, academic_year_id, school_grade_section_id)
+    )
+
+    return cached_etag_response(cached)
+
+def load_events(school_id, window=None, limit=None, position=None):
+    """Load one page of a school's events, returning (rows, has_more).
+
+    See get_event_data for the windows; position is the (date, id) of the
+    last row of the previous page.
+    """
+    now = datetime.now()
+    query = db.session.query(
+        Event.id,
+        Event.title,
+        Event.description,
+        Event.date,
+        case((Event.date >= now, "Green"), else_="Red").label('color')
+    ).filter(Event.school_id == school_id)
+
+    if window == 'upcoming':
+        query = query.filter(Event.date >= now)
+        order = (Event.date.asc(), Event.id.asc())
+        if position:
+            query = query.filter(or_(
+                Event.date > position[0], and_(Event.date == position[0], Event.id > position[1])
+            ))
+    else:
+        if window == 'past':
+            query = query.filter(Event.date < now)
+        order = (Event.date.desc(), Event.id.desc())
+        if position:
+            query = query.filter(or_(
+                Event.date < position[0], and_(Event.date == position[0], Event.id < position[1])
+            ))
+
+    limit = limit or app.config['EVENT_PAGE_SIZE']
+    events = query.order_by(*order).limit(limit + 1).all()
+    return events[:limit], len(events) > limit
+
+
+def event_list(events):
+    return [
         {
             "title": event.title,
             "description": event.description,
             "date": event.date,
-            "color":"Green" if event.date >= datetime.now() else "Red",
+            "color": event.color,
 
         }
         for event in events
     ] 
 
-    return jsonify(response_data), 200
 
+@app.route('/api/events/<int:school_id>', methods=['GET'])
+def get_event_data(school_id):
+    """Return a school's events one page at a time.
+
+    `window` may be `upcoming` (soonest first, paged with `after`) or `past`
+    (latest first, paged with `before`); without it all events are returned
+    latest first, paged with `before`. The cursor for the next page is sent
+    in the X-Next-Cursor header.
+    """
+    window = request.args.get('window')
+    if window not in (None, 'upcoming', 'past'):
+        return jsonify({"error": "window must be 'upcoming' or 'past'"}), 400
+
+    cursor_param = 'after' if window == 'upcoming' else 'before'
+    try:
+        cursor = request.args.get(cursor_param)
+        position = decode_cursor(cursor, datetime.fromisoformat) if cursor else None
+        limit = limit_arg(app.config['EVENT_PAGE_SIZE'], app.config['EVENT_MAX_PAGE_SIZE'])
+    except ValueError:
+        return jsonify({"error": f"Invalid {cursor_param} or limit parameter"}), 400
+
+    events, has_more = load_events(school_id, window, limit, position)
+    if not events and not cursor:
+        return jsonify({"error": "No events available."}), 404
 
-@app.route('/api/transports/<int:school_id>', methods=['GET'])
-def get_transport_data(school_id):
+    response = etag_response(app.json.dumpb(event_list(events)))
+    if has_more:
+        last = events[-1]
+        response.headers['X-Next-Cursor'] = encode_cursor(last.date, last.id)
+    return response
+
+
+transport_cache = TTLCache(
+    'transport', ttl=app.config['TRANSPORT_CACHE_TTL'], max_entries=app.config['TRANSPORT_CACHE_MAX_ENTRIES']
+)
+
+
+def build_transport_roster(school_id):
+    """Render a school's transport roster with its drivers and in-charges in
+    one joined query. Returns a CachedResponse, or None when the school has
+    no transports."""
+    driver = aliased(Staff)
+    in_charge = aliased(Staff)
+
+    transports = db.session.query(
+        Transport.driver_code,
+        Transport.vehicle_number,
+        Transport.route_number,
+        Transport.route_name,
+        Transport.vehicle_gps_device_id,
+        Transport.vehicle_tracking_url,
+        driver.first_name.label('driver_first_name'),
+        driver.last_name.label('driver_last_name'),
+        in_charge.first_name.label('in_charge_first_name'),
+        in_charge.last_name.label('in_charge_last_name')
+    ).join(
+        driver, Transport.driver_id == driver.id
+    ).join(
+        in_charge, Transport.in_charge_id == in_charge.id
+    ).filter(
+        Transport.school_id == school_id
+    ).order_by(
+        Transport.id
+    ).all()
 
-    transports = Transport.query.filter_by(school_id=school_id).all()
     if not transports:
-        return jsonify({"error": "No transports available."}), 404
+        return None
     
     response_data = [
         {
-            "driver_name": f"{transport.driver.first_name} {transport.driver.last_name}",
+            "driver_name": f"{transport.driver_first_name} {transport.driver_last_name}",
             "driver_code": transport.driver_code,
             "vehicle_number": transport.vehicle_number,
             "route_number": transport.route_number,
             "route_name": transport.route_name,
             "vehicle_gps_device_id": transport.vehicle_gps_device_id,
             "vehicle_tracking_url": transport.vehicle_tracking_url,
-            "in_charge_name":f"{transport.in_charge.first_name} {transport.in_charge.last_name}",            
+            "in_charge_name":f"{transport.in_charge_first_name} {transport.in_charge_last_name}",            
 
         }
         for transport in transports
     ] 
 
-    return jsonify(response_data), 200
+    return cached_response(app.json.dumpb(response_data))
+
+
+@on_change(Transport, Staff)
+def _invalidate_transport_roster(model, rows):
+    for row in rows:
+        if row.get('school_id') is None:
+            transport_cache.invalidate()
+            return
+        transport_cache.invalidate(row['school_id'])
+
+
+@app.route('/api/transports/<int:school_id>', methods=['GET'])
+def get_transport_data(school_id):
+
+    cached = transport_cache.get_or_load(school_id, lambda: build_transport_roster(school_id))
+    if not cached:
+        return jsonify({"error": "No transports available."}), 404
+
+    return cached_etag_response(cached)
+
+def date_arg(name):
+    """Parse an optional ISO-8601 (YYYY-MM-DD) date query parameter."""
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else None
+
+
+def limit_arg(default, maximum):
+    """Parse the optional page size query parameter, capped at maximum."""
+    limit = request.args.get('limit', default, type=int)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
+
+
+def encode_cursor(value, id):
+    """Build an opaque keyset cursor from the last row's sort value and id."""
+    return f"{value.isoformat()},{id}"
+
+
+def decode_cursor(cursor, parse):
+    value, _, id = cursor.rpartition(',')
+    return parse(value), int(id)
+
 
 @app.route('/api/attendances/<int:student_id>', methods=['GET'])
 def get_attendance_data(student_id):
+    """Return a student's attendance, newest first, one page at a time.
 
-    attendances = Attendance.query.filter_by(student_id=student_id).all()
-    if not attendances:
+    Optional `from`/`to` dates bound the range; when more rows are
+    available the X-Next-Cursor header holds the `cursor` for the next page.
+    """
+    try:
+        date_from = date_arg('from')
+        date_to = date_arg('to')
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor, date.fromisoformat) if cursor else None
+        limit = limit_arg(app.config['ATTENDANCE_PAGE_SIZE'], app.config['ATTENDANCE_MAX_PAGE_SIZE'])
+    except ValueError:
+        return jsonify({"error": "Invalid from, to, cursor or limit parameter"}), 400
+
+    query = db.session.query(
+        Attendance.id,
+        Attendance.attendence_date,
+        Attendance.is_present_morning,
+        Attendance.is_present_afternoon
+    ).filter(Attendance.student_id == student_id)
+
+    if date_from:
+        query = query.filter(Attendance.attendence_date >= date_from)
+    if date_to:
+        query = query.filter(Attendance.attendence_date <= date_to)
+    if after:
+        after_date, after_id = after
+        query = query.filter(or_(
+            Attendance.attendence_date < after_date,
+            and_(Attendance.attendence_date == after_date, Attendance.id < after_id)
+        ))
+
+    attendances = query.order_by(
+        Attendance.attendence_date.desc(), Attendance.id.desc()
+    ).limit(limit + 1).all()
+
+    has_more = len(attendances) > limit
+    attendances = attendances[:limit]
+    if not attendances and not cursor:
         return jsonify({"error": "No attendance  details available."}), 404
     
-    response_data = [
+    response = app.json.stream(
         {
-            
             "attendence_date": attendance.attendence_date,
             "is_present_morning": attendance.is_present_morning,
             "is_present_afternoon": attendance.is_present_afternoon,
-
-            "is_present_fullday":True if attendance.is_present_morning and  attendance.is_present_afternoon else False,
-            
-                
-
+            "is_present_fullday": bool(attendance.is_present_morning and attendance.is_present_afternoon),
         }
         for attendance in attendances
-    ]
-    return jsonify(response_data), 200
+    )
+    if has_more:
+        last = attendances[-1]
+        response.headers['X-Next-Cursor'] = encode_cursor(last.attendence_date, last.id)
+    return response
+
+
+@app.route('/api/attendances', methods=['POST'])
+@permission_required('attendance', 'edit')
+def mark_section_attendance():
+    """Mark a whole section's morning/afternoon attendance for a date.
+
+    Takes {"school_grade_section_id", "date", optional "period", "marks":
+    [{"student_id", "is_present_morning", "is_present_afternoon"}]} and
+    writes every mark with one upsert. Returns a result per mark, see
+    attendance.mark_attendance.
+    """
+    claims = get_jwt()
+    if claims.get('staff_id') is None or claims.get('school_id') is None:
+        return jsonify({"error": "Only staff can mark attendance."}), 403
+
+    data = request.get_json(silent=True) or {}
+    school_grade_section_id = data.get('school_grade_section_id')
+    marks = data.get('marks')
+    period = data.get('period')
+    try:
+        on = date.fromisoformat(data.get('date') or '')
+    except (TypeError, ValueError):
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+    if not isinstance(school_grade_section_id, int) or not isinstance(marks, list) or not marks:
+        return jsonify({"error": "school_grade_section_id and a list of marks are required"}), 400
+    if period is not None and not isinstance(period, str):
+        return jsonify({"error": "period must be a string"}), 400
+    if len(marks) > app.config['ATTENDANCE_BULK_LIMIT']:
+        return jsonify({"error": f"At most {app.config['ATTENDANCE_BULK_LIMIT']} marks per request"}), 400
+
+    results = mark_attendance(
+        claims['school_id'], school_grade_section_id, on, marks, claims['staff_id'], period=period
+    )
+    counts = dict.fromkeys(('inserted', 'updated', 'unchanged', 'rejected'), 0)
+    for outcome in results:
+        counts[outcome['status']] += 1
+    return jsonify({"date": on, "school_grade_section_id": school_grade_section_id, **counts, "results": results}), 200
+
+
+def staff_section_error(claims, school_grade_section_id):
+    """A 403 response unless the grade-section belongs to the staff
+    caller's school, otherwise None."""
+    school_id = db.session.query(SchoolsGradesSections.school_id).filter(
+        SchoolsGradesSections.id == school_grade_section_id
+    ).scalar()
+    if claims.get('staff_id') is None or school_id is None or school_id != claims.get('school_id'):
+        return jsonify({"error": "This grade-section is not in your school."}), 403
+    return None
+
+
+@app.route('/api/attendance-summary', methods=['GET'])
+@identity_optional
+def get_attendance_summary():
+    """Per-month, per-term and overall attendance for a student or a grade-section.
+
+    Takes `school_grade_section_id`, or else the caller's own student
+    (`student_id` when anonymous), and optional `from`/`to` dates which
+    default to the active academic year. The grade-section view lists every
+    student's attendance, so it is for staff of that school holding the
+    attendance view permission.
+    """
+    if request.args.get('school_grade_section_id') is not None:
+        return get_section_attendance_summary()
+
+    student_id = context_arg('student_id', allowed=are_siblings)
+    if student_id is None:
+        return jsonify({"error": "student_id or school_grade_section_id is required"}), 400
+    return attendance_summary_response(student_id=student_id)
+
+
+@permission_required('attendance', 'view')
+def get_section_attendance_summary():
+    school_grade_section_id = request.args.get('school_grade_section_id', type=int)
+    if school_grade_section_id is None:
+        return jsonify({"error": "Invalid school_grade_section_id parameter"}), 400
+    error = staff_section_error(get_jwt(), school_grade_section_id)
+    if error:
+        return error
+    return attendance_summary_response(
+        student_id=request.args.get('student_id', type=int), school_grade_section_id=school_grade_section_id
+    )
+
+
+def attendance_summary_response(student_id=None, school_grade_section_id=None):
+    try:
+        date_from = date_arg('from')
+        date_to = date_arg('to')
+    except ValueError:
+        return jsonify({"error": "Invalid from or to parameter"}), 400
+
+    if not (date_from or date_to):
+        active_academic_year = reference.active_academic_year()
+        if active_academic_year:
+            date_from, date_to = active_academic_year.start_date, active_academic_year.end_date
+
+    summary = attendance_summary(
+        student_id=student_id,
+        school_grade_section_id=school_grade_section_id,
+        date_from=date_from,
+        date_to=date_to,
+        terms=app.config['ACADEMIC_TERMS']
+    )
+    summary.update({
+        "student_id": student_id,
+        "school_grade_section_id": school_grade_section_id,
+        "from": date_from.isoformat() if date_from else None,
+        "to": date_to.isoformat() if date_to else None,
+    })
+    return jsonify(summary), 200
 
 
 @app.route('/api/userbyid/<int:user_id>', methods=['GET'])
@@ -324,13 +795,8 @@ def get_exam_schedules():
             ExamSchedule.id,
             ExamSchedule.term,
             ExamSchedule.exam_date,
-            Subject.title.label('subject'),
-            Grade.title.label('grade'),
-           
-        ).join(
-            Subject, ExamSchedule.subject_id == Subject.id
-        ).join(
-            Grade, ExamSchedule.grade_id == Grade.id
+            ExamSchedule.subject_id,
+            ExamSchedule.grade_id,
         ).filter(
             ExamSchedule.grade_id == grade_id
         ).order_by(
@@ -338,54 +804,160 @@ def get_exam_schedules():
             ExamSchedule.term.asc()
         ).all()
 
+        subjects = reference.titles(Subject, [sch.subject_id for sch in schedules])
+        grades = reference.titles(Grade, [sch.grade_id for sch in schedules])
+
+        # Schedules whose subject or grade no longer exists are skipped, as the
+        # inner joins used to do
         schedule_list = [
             {
                 "id": sch.id,
                 "term": sch.term,
                 "exam_date": sch.exam_date,
-                "subject": sch.subject,
-                "grade": sch.grade,
+                "subject": subjects[sch.subject_id],
+                "grade": grades[sch.grade_id],
                 
             }
             for sch in schedules
+            if sch.subject_id in subjects and sch.grade_id in grades
         ]
 
-        return jsonify(schedule_list), 200
+        return etag_response(app.json.dumpb(schedule_list))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 
 @app.route('/api/exam_mark_details', methods=['GET'])
+@identity_optional
 def get_exam_mark_details():
     
-    student_id = request.args.get('student_id')
+    student_id = context_arg('student_id', allowed=are_siblings)
     term = request.args.get('term')
     
     results = db.session.query(
         ExamMarks.id, ExamMarks.term, ExamMarks.student_id, ExamMarks.subject_id, 
-        ExamMarkDetails.weightage, ExamMarkDetails.marks_obtained, ExamMarkDetails.marks_out_of,
-        Subject.title
-    ).join(ExamMarkDetails, ExamMarks.id == ExamMarkDetails.exam_mark_id).join(Subject, ExamMarks.subject_id == Subject.id).filter(ExamMarks.student_id == student_id).filter(ExamMarks.term == term).order_by(getattr(ExamMarks, "term").asc()).all()
-    
+        ExamMarkDetails.weightage, ExamMarkDetails.marks_obtained, ExamMarkDetails.marks_out_of
+    ).join(ExamMarkDetails, ExamMarks.id == ExamMarkDetails.exam_mark_id).filter(ExamMarks.student_id == student_id).filter(ExamMarks.term == term).order_by(getattr(ExamMarks, "term").asc()).all()
+
+    subjects = reference.titles(Subject, [record.subject_id for record in results])
+
     output = [
         {
             "term": record.term,
             "subject_id": record.subject_id,
-            "subject_title": record.title,
+            "subject_title": subjects[record.subject_id],
             "weightage": record.weightage,
             "marks_obtained": record.marks_obtained,
             "marks_out_of": record.marks_out_of
         } for record in results
+        if record.subject_id in subjects
     ]
     
     return jsonify(output)
 
 
 
+report_card_cache = TTLCache('report_card', ttl=app.config['REPORT_CARD_CACHE_TTL'])
+
+
+@on_change(ExamMarks, ExamMarkDetails, SchoolStudent, Subject)
+def _invalidate_report_cards(model, rows):
+    if model is ExamMarks and all(row.get('term') for row in rows):
+        terms = {row['term'] for row in rows}
+        report_card_cache.invalidate_where(lambda key: key[1] in terms)
+    else:
+        report_card_cache.invalidate()
+
+
+@app.route('/api/exam-marks/upload', methods=['POST'])
+@permission_required('report-cards', 'edit')
+def upload_exam_marks():
+    """Replace a section's marks for a term from a CSV upload.
+
+    Takes `school_grade_section_id` and `term` as query parameters and the
+    CSV (see exam_marks.MARK_COLUMNS) as the request body, or as the `file`
+    field of a multipart form. The body is parsed as it streams in; nothing
+    is written unless every row is valid.
+    """
+    claims = get_jwt()
+    if claims.get('staff_id') is None or claims.get('school_id') is None:
+        return jsonify({"error": "Only staff can upload marks."}), 403
+
+    school_grade_section_id = request.args.get('school_grade_section_id', type=int)
+    term = request.args.get('term')
+    if school_grade_section_id is None or not term:
+        return jsonify({"error": "school_grade_section_id and term are required"}), 400
+
+    upload = request.files['file'].stream if 'file' in request.files else request.stream
+    lines = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    try:
+        counts = ingest_exam_marks(
+            claims['school_id'], school_grade_section_id, term, claims['staff_id'], lines,
+            app.config['EXAM_MARKS_UPLOAD_MAX_ROWS']
+        )
+    except MarksUploadError as e:
+        return jsonify({"error": "The upload was rejected", "errors": e.errors}), 400
+    except UnicodeDecodeError:
+        return jsonify({"error": "The upload must be UTF-8 CSV"}), 400
+    return jsonify(counts), 200
+
+
+@app.route('/api/report-cards', methods=['GET'])
+@use_primary
+@permission_required('report-cards', 'view')
+def get_report_cards():
+    """Report cards for a grade-section and term: the class view, or one
+    student's card with class context when `student_id` is given.
+
+    Staff may see any grade-section of their school. Other callers (parents)
+    only get their own student's card, from their token's grade-section.
+
+    Read from the primary: teachers look at the class right after an
+    upload, and a report card rebuilt from a lagging replica would be
+    cached for REPORT_CARD_CACHE_TTL.
+    """
+    claims = get_jwt()
+    term = request.args.get('term')
+    school_grade_section_id = request.args.get('school_grade_section_id', type=int)
+    student_id = request.args.get('student_id', type=int)
+
+    if claims.get('staff_id') is None:
+        if (student_id not in (None, claims.get('student_id'))
+                or school_grade_section_id not in (None, claims.get('school_grade_section_id'))):
+            return jsonify({"error": "You may only see your own report card."}), 403
+        school_grade_section_id = claims.get('school_grade_section_id')
+        student_id = claims.get('student_id')
+        if student_id is None:
+            return jsonify({"error": "You may only see your own report card."}), 403
+
+    if school_grade_section_id is None or not term:
+        return jsonify({"error": "school_grade_section_id and term are required"}), 400
+    if claims.get('staff_id') is not None:
+        error = staff_section_error(claims, school_grade_section_id)
+        if error:
+            return error
+
+    report_card = report_card_cache.get_or_load(
+        (school_grade_section_id, term),
+        lambda: build_report_card(school_grade_section_id, term)
+    )
+    if not report_card["students"]:
+        return jsonify({"error": "No exam marks available."}), 404
+
+    if student_id is not None:
+        student = student_report_card(report_card, student_id)
+        if student is None:
+            return jsonify({"error": "No exam marks available for this student."}), 404
+        return jsonify(student), 200
+
+    return jsonify(report_card), 200
+
+
 @app.route('/api/get_messages', methods=['GET'])
+@identity_optional
 def get_messges():
-    school_id = request.args.get('school_id')
+    school_id = context_arg('school_id')
     message_type = request.args.get('type')
     if not school_id or not message_type:
         return jsonify({"error": "Missing required parameters"}), 404
@@ -403,11 +975,7 @@ def get_messges():
 
     return jsonify({"result": result}), 200
 
-@app.route('/api/fees', methods=['GET'])
-def get_fee_details():
-    
-    student_id = request.args.get('student_id')
-        
+def fee_list(student_id):
     fees = db.session.query(
         Fee.id,
         Fee.student_id,
@@ -420,10 +988,7 @@ def get_fee_details():
         FeeType.school_id
     ).join(FeeType, Fee.fee_type_id == FeeType.id).filter(Fee.student_id == student_id).all()
 
-    if not fees:
-        return jsonify({"message": "No fee records found"}), 404
-
-    fee_list = [
+    return [
         {
             "id": fee.id,
             "student_id": fee.student_id,
@@ -433,16 +998,225 @@ def get_fee_details():
             "discount_percentage": fee.discount_percentage,
             "fine_percentage": fee.fine_percentage,
             "paid_amount": fee.paid_amount,
-            "payment_date": fee.payment_date.strftime("%Y-%m-%d") if fee.payment_date else None
+            "payment_date": fee.payment_date
         }
         for fee in fees
     ]
 
-    return jsonify(fee_list)
-
 
+@app.route('/api/fees', methods=['GET'])
+@identity_optional
+def get_fee_details():
     
+    student_id = context_arg('student_id', allowed=are_siblings)
+
+    fees = fee_list(student_id)
+    if not fees:
+        return jsonify({"message": "No fee records found"}), 404
+
+    return jsonify(fees)
+
+
+@app.route('/api/fee-dues', methods=['GET'])
+@permission_required('fee-dues', 'view')
+def get_fee_dues():
+    """Outstanding fee balances for the caller's school, overall, per fee
+    type and per student.
+
+    The school comes from the token; a `school_id` naming another school is
+    refused. Takes optional `academic_year_id` (the active year), `as_of`
+    (today) and `student_id`.
+    """
+    school_id = get_jwt().get('school_id')
+    if school_id is None or request.args.get('school_id', school_id, type=int) != school_id:
+        return jsonify({"error": "You may only see your own school's fee dues."}), 403
+    academic_year_id = request.args.get('academic_year_id', type=int)
+    student_id = request.args.get('student_id', type=int)
+    try:
+        as_of = date_arg('as_of') or date.today()
+    except ValueError:
+        return jsonify({"error": "Invalid as_of parameter"}), 400
+    if academic_year_id is None:
+        active_academic_year = reference.active_academic_year()
+        if active_academic_year is None:
+            return jsonify({"error": "No active academic year"}), 404
+        academic_year_id = active_academic_year.id
+
+    return jsonify(fee_dues(school_id, academic_year_id, as_of, student_id=student_id)), 200
+
+
+def message_list(school_id):
+    rows = db.session.query(
+        GeneralMessage.id, GeneralMessage.school_id, GeneralMessage.title,
+        GeneralMessage.description, GeneralMessage.type
+    ).filter(GeneralMessage.school_id == school_id).order_by(GeneralMessage.id).all()
+
+    return [
+        {
+            "id": row.id,
+            "school_id": row.school_id,
+            "title": row.title,
+            "description": row.description,
+            "type": row.type
+        }
+        for row in rows
+    ]
+
+
+bootstrap_executor = ThreadPoolExecutor(
+    max_workers=app.config['BOOTSTRAP_WORKERS'], thread_name_prefix='bootstrap'
+)
+
+
+def _run_section(read_replica, fn, *args):
+    """Run one bootstrap section in its own app context, and so with its own
+    session and connection, returning the section's JSON bytes and its SQL
+    and serialization counters for the request's metrics. Sections served
+    from a response cache return their rendered bytes as they are."""
+    with app.app_context():
+        g.db_read_replica = read_replica
+        start_counting()
+        section = fn(*args)
+        body = section if isinstance(section, bytes) else app.json.dumpb(section)
+        return body, counters()
+
+
+@app.route('/api/bootstrap/<int:student_id>', methods=['GET'])
+@jwt_required()
+def get_bootstrap_data(student_id):
+    """Everything the app's home screen needs in one round trip.
+
+    The student must be the caller's own or a sibling (see is_sibling). The
+    independent sections run concurrently on a bounded thread pool. A
+    section that fails, or is not ready within BOOTSTRAP_SECTION_TIMEOUT
+    seconds, is returned as {"error": ...} without holding up the rest.
+    """
+    own_id = get_jwt().get('student_id')
+    profiles = load_student_profiles({student_id, own_id} if own_id else {student_id})
+    profile, own = profiles.get(student_id), profiles.get(own_id)
+    if not profile or not profile.grade_section:
+        return jsonify({"error": "No student data available for this user."}), 404
+    if not own or (student_id != own_id and not is_sibling(own.student, profile.student)):
+        return jsonify({"error": "Student does not belong to this user."}), 403
+
+    grade_section = profile.grade_section
+    academic_year = profile.academic_year
+    sections = {
+        "events": (lambda: event_list(load_events(grade_section.school_id, 'upcoming')[0]),),
+        "timetable": (lambda: timetable_cache.get_or_load(
+            (grade_section.school_id, grade_section.academic_year_id, grade_section.id),
+            lambda: build_timetable(grade_section.school_id, grade_section.academic_year_id, grade_section.id)
+        ).body,),
+        "messages": (message_list, grade_section.school_id),
+        "fees": (fee_list, student_id),
+        "attendance_summary": (lambda: attendance_summary(
+            student_id=student_id,
+            date_from=academic_year.start_date if academic_year else None,
+            date_to=academic_year.end_date if academic_year else None,
+            terms=app.config['ACADEMIC_TERMS']
+        ),),
+    }
+    read_replica = g.get('db_read_replica', False)
+    futures = {
+        name: bootstrap_executor.submit(_run_section, read_replica, *section)
+        for name, section in sections.items()
+    }
+
+    parts = {"student_data": app.json.dumpb(student_profile_data(profile, detailed=True))}
+    done, _ = wait(futures.values(), timeout=app.config['BOOTSTRAP_SECTION_TIMEOUT'])
+    for name, future in futures.items():
+        if future not in done:
+            future.cancel()
+            parts[name] = app.json.dumpb({"error": "timeout"})
+        elif future.exception() is not None:
+            app.logger.error("Bootstrap section %s failed", name, exc_info=future.exception())
+            parts[name] = app.json.dumpb({"error": "unavailable"})
+        else:
+            parts[name], counts = future.result()
+            add_counters(counts)
+
+    # The sections are already serialized, the timetable straight from its
+    # cache, so the combined body is stitched together rather than re-encoded
+    body = b'{' + b','.join(b'"%s":%s' % (name.encode(), part) for name, part in parts.items()) + b'}'
+    return app.response_class(body, status=200, mimetype='application/json')
+
+@app.route('/api/exports/<kind>', methods=['GET'])
+@permission_required('exports', 'view')
+def export_school_data(kind):
+    """Stream a school's attendance, fees or marks for one academic year.
+
+    The school is the caller's own, from the token; a `school_id` naming
+    another school is refused. Takes an optional `academic_year_id` (the
+    active year by default) and `format`, `ndjson` (default) or `csv`. Rows
+    are read EXPORT_BATCH_SIZE at a time and written out as they arrive, so
+    memory stays flat however large the school is.
+    """
+    if kind not in EXPORTS:
+        return jsonify({"error": f"Unknown export, expected one of {', '.join(EXPORTS)}"}), 404
+
+    school_id = get_jwt().get('school_id')
+    if school_id is None or request.args.get('school_id', school_id, type=int) != school_id:
+        return jsonify({"error": "You may only export your own school's data."}), 403
+    academic_year_id = request.args.get('academic_year_id', type=int)
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    if academic_year_id is None:
+        active_academic_year = reference.active_academic_year()
+        if active_academic_year is None:
+            return jsonify({"error": "No active academic year"}), 404
+        academic_year_id = active_academic_year.id
+
+    statement = EXPORTS[kind](school_id, academic_year_id)
+    columns = list(statement.selected_columns.keys())
+    batches = export_rows(statement, app.config['EXPORT_BATCH_SIZE'])
+    chunks = encode_csv(columns, batches) if export_format == 'csv' else encode_ndjson(columns, batches)
+
+    response = app.response_class(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{kind}-{school_id}-{academic_year_id}.{export_format}"'
+    )
+    return response
+
+
+@app.route('/api/permissions', methods=['GET'])
+@jwt_required()
+def get_permissions():
+    """The modules the caller may use and what they may do in each."""
+    claims = get_jwt()
+    granted = permissions.granted(claims.get('school_subscription_id'), claims.get('role_ids') or ())
+    return jsonify({"permissions": granted}), 200
+
+
+@app.route('/api/menu', methods=['GET'])
+@jwt_required()
+def get_menu():
+    """The app menu tree for the caller's school subscription and roles.
+
+    `role_id` narrows the menu to one of the caller's roles.
+    """
+    claims = get_jwt()
+    role_ids = claims.get('role_ids') or []
+    role_id = request.args.get('role_id', type=int)
+    if role_id is not None:
+        if role_id not in role_ids:
+            return jsonify({"error": "You do not have this role."}), 403
+        role_ids = [role_id]
+
+    menu = permissions.menu(claims.get('school_subscription_id'), role_ids)
+    return jsonify({"menu": menu}), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of the process metrics."""
+    return app.response_class(render_prometheus(), status=200, mimetype='text/plain; version=0.0.4')
+
 
+@app.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Hit/miss counters of the in-process caches."""
+    return jsonify(cache_stats()), 200
 
 
 if __name__ == '__main__':
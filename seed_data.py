@@ -0,0 +1,212 @@
+# seed_data.py
+"""Fill a database with a synthetic school dataset built on the models.
+
+    DATABASE_URL=sqlite:///bench.db APP_ENV=testing python seed_data.py --scale medium
+
+The target database should be empty. Rows are written with batched Core
+inserts and explicit ids, so even the large scale loads quickly. Every
+generated user has the password SEED_PASSWORD. Parents are named
+parent<student id> and each school has an admin<school id> staff user
+with every permission on every module; parents may view all modules but
+the exports and fee dues.
+"""
+
+import argparse
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert, text
+from hashing import hasher
+from models import (
+    AcademicYear, Attendance, Event, ExamMarkDetails, ExamMarks, ExamSchedule, Fee, FeeType,
+    GeneralMessage, Grade, Module, Permission, Role, School, SchoolFee, SchoolStudent, SchoolSubscription,
+    SchoolSubscriptionModuleRolePermission, SchoolsGradesSections, Section, Staff, StaffType, Student,
+    Subject, Subscription, TimeTable, TimeTableDetails, Transport, User, UserRole, db
+)
+
+SEED_PASSWORD = 'password'
+
+SCALES = {
+    'small': dict(schools=1, grades=2, sections_per_grade=1, students_per_section=20, staff_per_school=10,
+                  subjects=5, events=60, transports=5, attendance_days=60),
+    'medium': dict(schools=2, grades=6, sections_per_grade=2, students_per_section=40, staff_per_school=40,
+                   subjects=8, events=300, transports=20, attendance_days=120),
+    'large': dict(schools=3, grades=10, sections_per_grade=3, students_per_section=40, staff_per_school=80,
+                  subjects=10, events=1000, transports=60, attendance_days=200),
+}
+
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')
+PERIODS_PER_DAY = 8
+TERMS = ('Term 1', 'Term 2', 'Term 3')
+PERMISSIONS = ('view', 'create', 'edit', 'delete')
+# (module name, parent module name); parents come first
+MODULES = (
+    ('academics', None), ('timetable', 'academics'), ('attendance', 'academics'),
+    ('report-cards', 'academics'), ('fees', None), ('fee-dues', 'fees'), ('exports', None),
+)
+PARENT_MODULES = ('academics', 'timetable', 'attendance', 'report-cards', 'fees')
+EVALUATIONS = (('written', 80, 100), ('internal', 20, 20))
+BATCH_SIZE = 5000
+
+
+class _Rows:
+    """Collects rows per model and writes them in batched executemany inserts."""
+
+    def __init__(self):
+        self.rows = {}
+        self.ids = {}
+
+    def add(self, model, **values):
+        id = self.ids[model] = self.ids.get(model, 0) + 1
+        self.rows.setdefault(model, []).append(dict(values, id=id))
+        return id
+
+    def flush(self):
+        for model, rows in self.rows.items():
+            for start in range(0, len(rows), BATCH_SIZE):
+                db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+            if db.session.get_bind().dialect.name == 'postgresql':
+                # Explicit ids do not advance the serial sequences
+                db.session.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), {len(rows)})"
+                ))
+        db.session.commit()
+        return {model.__tablename__: len(rows) for model, rows in self.rows.items()}
+
+
+def generate(scale='small', seed=0, **overrides):
+    """Generate a dataset at the given scale inside the current app context.
+
+    Returns the number of rows written per table.
+    """
+    params = dict(SCALES[scale], **overrides)
+    rnd = random.Random(seed)
+    rows = _Rows()
+
+    start_date = date(date.today().year - 1, 6, 1)
+    academic_year_id = rows.add(AcademicYear, start_date=start_date,
+                                end_date=date(start_date.year + 1, 3, 31), active=True)
+    staff_type_id = rows.add(StaffType, title='Teacher')
+    role_id = rows.add(Role, role_name='Parent', role_type='student', is_active=True)
+    admin_role_id = rows.add(Role, role_name='Admin', role_type='admin', is_active=True)
+    subscription_id = rows.add(Subscription, title='Standard', status=True)
+    permission_ids = [rows.add(Permission, permission_name=name, is_active=True) for name in PERMISSIONS]
+    module_ids = {}
+    for n, (name, parent) in enumerate(MODULES):
+        module_ids[name] = rows.add(Module, module_name=name, menu_name=name.replace('-', ' ').title(),
+                                    module_link=f'/{name}', parent_id=module_ids.get(parent), is_active=True,
+                                    is_visible_in_app=True, priority=n)
+    password_hash = hasher.hash(SEED_PASSWORD)
+    now = datetime.now()
+
+    for s in range(params['schools']):
+        school_id = rows.add(School, code=f'SCH{s + 1:03d}', title=f'School {s + 1}', status=True)
+        staff_ids = [
+            rows.add(Staff, school_id=school_id, staff_type_id=staff_type_id,
+                     first_name=f'Staff{n}', last_name=f'S{school_id}', status=True)
+            for n in range(params['staff_per_school'])
+        ]
+        school_subscription_id = rows.add(SchoolSubscription, title='Standard', school_id=school_id,
+                                          subscription_id=subscription_id, academic_year_id=academic_year_id,
+                                          status=True)
+        admin_id = rows.add(User, staff_id=staff_ids[0], username=f'admin{school_id}', password=password_hash,
+                            is_active=True)
+        rows.add(UserRole, user_id=admin_id, role_id=admin_role_id)
+        for name, module_id in module_ids.items():
+            for permission_id in permission_ids:
+                rows.add(SchoolSubscriptionModuleRolePermission, school_subscription_id=school_subscription_id,
+                         module_id=module_id, role_id=admin_role_id, permission_id=permission_id)
+            if name in PARENT_MODULES:
+                rows.add(SchoolSubscriptionModuleRolePermission, school_subscription_id=school_subscription_id,
+                         module_id=module_id, role_id=role_id, permission_id=permission_ids[0])
+        subject_ids = [rows.add(Subject, school_id=school_id, title=f'Subject {n + 1}')
+                       for n in range(params['subjects'])]
+        transport_ids = [
+            rows.add(Transport, school_id=school_id, driver_id=rnd.choice(staff_ids),
+                     in_charge_id=rnd.choice(staff_ids), driver_code=f'D{n}', vehicle_number=f'KL-{n:04d}',
+                     route_number=str(n), route_name=f'Route {n}')
+            for n in range(params['transports'])
+        ]
+        for n in range(params['events']):
+            rows.add(Event, school_id=school_id, title=f'Event {n}', description='Synthetic event',
+                     date=now + timedelta(days=n - params['events'] // 2))
+        rows.add(GeneralMessage, school_id=school_id, title='Welcome', description='Synthetic message', type=1)
+
+        fee_type_id = rows.add(FeeType, school_id=school_id, title='Tuition', status=1)
+        rows.add(SchoolFee, fee_type_id=fee_type_id, payment_type=1, academic_year_id=academic_year_id,
+                 fee_amount=20000, discount_percentage=5, fine_percentage=10,
+                 fee_payment_last_date_with_deduction=start_date + timedelta(days=30),
+                 fee_payment_last_date_without_deduction=start_date + timedelta(days=60),
+                 fee_payment_last_date_with_fine=start_date + timedelta(days=90))
+
+        section_ids = [rows.add(Section, school_id=school_id, title=chr(ord('A') + n))
+                       for n in range(params['sections_per_grade'])]
+        for gr in range(params['grades']):
+            grade_id = rows.add(Grade, school_id=school_id, title=str(gr + 1))
+            for subject_id in subject_ids:
+                for t, term in enumerate(TERMS):
+                    rows.add(ExamSchedule, term=term, subject_id=subject_id, grade_id=grade_id,
+                             exam_date=start_date + timedelta(days=90 * (t + 1)))
+
+            for section_id in section_ids:
+                sgs_id = rows.add(SchoolsGradesSections, school_id=school_id, grade_id=grade_id,
+                                  section_id=section_id, academic_year_id=academic_year_id)
+                time_table_id = rows.add(TimeTable, school_id=school_id, academic_year_id=academic_year_id,
+                                         schools_grades_sections_id=sgs_id)
+                for d, day in enumerate(DAYS):
+                    for p in range(PERIODS_PER_DAY):
+                        rows.add(TimeTableDetails, time_table_id=time_table_id, day_name=day,
+                                 order_number=d * PERIODS_PER_DAY + p, time_slot=f'{8 + p}:00',
+                                 subject_id=rnd.choice(subject_ids), staff_id=rnd.choice(staff_ids))
+
+                for _ in range(params['students_per_section']):
+                    student_id = rows.add(
+                        Student, school_id=school_id, first_name='Student', last_name=f'G{gr + 1}',
+                        dob=date(2012, 1, 1) + timedelta(days=rnd.randrange(2000)),
+                        father_mobile=f'9{rnd.randrange(10 ** 9):09d}', status=1
+                    )
+                    rows.add(SchoolStudent, student_id=student_id, school_grade_section_id=sgs_id,
+                             academic_year_id=academic_year_id, transport_id=rnd.choice(transport_ids),
+                             status=True)
+                    user_id = rows.add(User, student_id=student_id, username=f'parent{student_id}',
+                                       password=password_hash, is_active=True)
+                    rows.add(UserRole, user_id=user_id, role_id=role_id)
+                    paid_amount = rnd.choice((0, 10000, 19000, 20000))
+                    rows.add(Fee, fee_type_id=fee_type_id, student_id=student_id, actual_fee=20000,
+                             paid_amount=paid_amount,
+                             payment_date=start_date + timedelta(days=rnd.randrange(90)) if paid_amount else None)
+
+                    for k in range(params['attendance_days']):
+                        rows.add(Attendance, student_id=student_id, staff_id=staff_ids[0],
+                                 schools_grades_sections_id=sgs_id, attendence_date=start_date + timedelta(days=k),
+                                 is_present_morning=rnd.random() > 0.08, is_present_afternoon=rnd.random() > 0.1,
+                                 created_by=staff_ids[0], created_on=start_date + timedelta(days=k))
+
+                    for subject_id in subject_ids:
+                        for term in TERMS:
+                            exam_mark_id = rows.add(ExamMarks, term=term, student_id=student_id,
+                                                    subject_id=subject_id, staff_id=rnd.choice(staff_ids))
+                            for evaluation_type, weightage, out_of in EVALUATIONS:
+                                rows.add(ExamMarkDetails, exam_mark_id=exam_mark_id,
+                                         evaluation_type=evaluation_type, weightage=weightage,
+                                         marks_obtained=round(rnd.uniform(0.3, 1) * out_of, 1),
+                                         marks_out_of=out_of)
+
+    return rows.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from schoopleapi import app
+
+    with app.app_context():
+        db.create_all()
+        for table, count in generate(args.scale, args.seed).items():
+            print(f'{table:32} {count:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# tests/conftest.py
+"""Run the API against a SQLite file filled with the small seed_data dataset.
+
+A copy of the file made after seeding stands in for a read replica, so GET
+requests read from it (see routing.py). The app reads its configuration at
+import time, so the environment is set up before schoopleapi is imported.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DB_DIR = tempfile.mkdtemp(prefix='schoople-tests-')
+PRIMARY_DB = os.path.join(DB_DIR, 'primary.db')
+REPLICA_DB = os.path.join(DB_DIR, 'replica.db')
+os.environ['APP_ENV'] = 'testing'
+os.environ['DATABASE_URL'] = f'sqlite:///{PRIMARY_DB}'
+os.environ['DATABASE_REPLICA_URLS'] = f'sqlite:///{REPLICA_DB}'
+
+from models import db  # noqa: E402
+from schoopleapi import app  # noqa: E402
+import seed_data  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def client():
+    with app.app_context():
+        db.create_all()
+        seed_data.generate('small')
+    shutil.copyfile(PRIMARY_DB, REPLICA_DB)
+    return app.test_client()
+
+
+def _login(client, username):
+    response = client.post('/api/login', json={'username': username, 'password': seed_data.SEED_PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+@pytest.fixture(scope='session')
+def parent_auth(client):
+    """Headers authenticating as parent1, the parent of student 1."""
+    return _login(client, 'parent1')
+
+
+@pytest.fixture(scope='session')
+def admin_auth(client):
+    """Headers authenticating as admin1, who holds every permission in school 1."""
+    return _login(client, 'admin1')
+
+
+@pytest.fixture
+def statements():
+    """The SQL statements executed while the test runs."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(Engine, 'before_cursor_execute', record)
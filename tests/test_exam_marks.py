@@ -0,0 +1,40 @@
+# tests/test_exam_marks.py
+"""CSV uploads of exam marks (see exam_marks.py)."""
+
+from sqlalchemy import select
+from models import ExamMarks, SchoolStudent, Subject, db
+from schoopleapi import app
+
+TERM = 'Upload test'
+
+
+def _upload(client, auth, pairs):
+    lines = ['student_id,subject_id,evaluation_type,weightage,marks_obtained,marks_out_of']
+    lines += [f'{student_id},{subject_id},Written,100,40,50' for student_id, subject_id in pairs]
+    response = client.post(
+        f'/api/exam-marks/upload?school_grade_section_id=1&term={TERM}',
+        headers=auth, data='\n'.join(lines), content_type='text/csv'
+    )
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_upload_replaces_only_the_uploaded_subjects_of_each_student(client, admin_auth):
+    with app.app_context():
+        first, second = db.session.scalars(
+            select(SchoolStudent.student_id).where(SchoolStudent.school_grade_section_id == 1)
+            .order_by(SchoolStudent.student_id).limit(2)
+        ).all()
+        maths, science = db.session.scalars(
+            select(Subject.id).where(Subject.school_id == 1).order_by(Subject.id).limit(2)
+        ).all()
+
+    _upload(client, admin_auth, [(first, maths), (first, science), (second, maths), (second, science)])
+    # Each student's other subject is not in this upload and must survive it
+    _upload(client, admin_auth, [(first, maths), (second, science)])
+
+    with app.app_context():
+        headers = db.session.execute(
+            select(ExamMarks.student_id, ExamMarks.subject_id).where(ExamMarks.term == TERM)
+        ).all()
+    assert sorted(headers) == sorted([(first, maths), (first, science), (second, maths), (second, science)])
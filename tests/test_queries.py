@@ -0,0 +1,65 @@
+# tests/test_queries.py
+"""Statement-count regression tests for the hot endpoints.
+
+Each endpoint is called once to warm the in-process caches, as it would be
+by the first of the morning's requests, and the next call is counted.
+"""
+
+from datetime import date
+from models import SchoolStudent, Student, db
+from schoopleapi import app, transport_cache
+from seed_data import SEED_PASSWORD
+
+
+def test_login_loads_profile_in_one_query(client, statements):
+    credentials = {'username': 'parent1', 'password': SEED_PASSWORD}
+    client.post('/api/login', json=credentials)
+    statements.clear()
+
+    response = client.post('/api/login', json=credentials)
+
+    assert response.status_code == 200
+    assert response.get_json()['student_data']['student_id'] == 1
+    # User, student profile, role ids and school subscription
+    assert len(statements) <= 4, statements
+
+
+def test_student_data_loads_profile_in_one_query(client, parent_auth, statements):
+    client.get('/api/student-data/1', headers=parent_auth)
+    statements.clear()
+
+    response = client.get('/api/student-data/1', headers=parent_auth)
+
+    assert response.status_code == 200
+    assert response.get_json()['student_data']['grade'] == '1'
+    assert len(statements) <= 1, statements
+
+
+def test_student_data_of_student_without_enrolment_is_not_found(client, parent_auth):
+    with app.app_context():
+        db.session.add(Student(id=9001, school_id=1, first_name='Not', last_name='Enrolled', dob=date(2015, 1, 1)))
+        db.session.commit()
+    try:
+        # The student was only written to the primary
+        response = client.get('/api/student-data/9001', headers=dict(parent_auth, **{'X-Read-Primary': '1'}))
+        assert response.status_code == 404
+    finally:
+        with app.app_context():
+            db.session.query(SchoolStudent).filter(SchoolStudent.student_id == 9001).delete()
+            db.session.query(Student).filter(Student.id == 9001).delete()
+            db.session.commit()
+
+
+def test_transport_roster_is_one_query_then_cached(client, statements):
+    transport_cache.invalidate()
+
+    response = client.get('/api/transports/1')
+
+    assert response.status_code == 200
+    assert len(response.get_json()) == 5
+    # Drivers and in-charges are joined in, not loaded per vehicle
+    assert len(statements) == 1, statements
+
+    statements.clear()
+    assert client.get('/api/transports/1').status_code == 200
+    assert statements == []
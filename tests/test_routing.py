@@ -0,0 +1,61 @@
+# tests/test_routing.py
+"""Read/write routing between the primary and the replica (see routing.py)."""
+
+import os
+import pytest
+from flask import g
+from sqlalchemy import event, insert, select
+from sqlalchemy.engine import Engine
+from models import Event, GeneralMessage, db
+from schoopleapi import app, report_card_cache
+
+
+@pytest.fixture
+def databases():
+    """The database file each statement executed during the test ran on."""
+    used = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        used.append(os.path.basename(conn.engine.url.database))
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    yield used
+    event.remove(Engine, 'before_cursor_execute', record)
+
+
+def test_get_reads_from_replica(client, databases):
+    assert client.get('/api/events/1?limit=1').status_code == 200
+    assert databases and set(databases) == {'replica.db'}
+
+
+def test_read_primary_header_forces_primary(client, databases):
+    response = client.get('/api/events/1?limit=1', headers={'X-Read-Primary': '1'})
+    assert response.status_code == 200
+    assert databases and set(databases) == {'primary.db'}
+
+
+def test_use_primary_view_reads_from_primary(client, admin_auth, databases):
+    report_card_cache.invalidate()
+    response = client.get('/api/report-cards?school_grade_section_id=1&term=Term%201', headers=admin_auth)
+    assert response.status_code == 200
+    assert databases and set(databases) == {'primary.db'}
+
+
+def test_writes_go_to_primary(client, admin_auth, databases):
+    response = client.post('/api/attendances', headers=admin_auth, json={
+        'school_grade_section_id': 1,
+        'date': '2000-01-03',
+        'marks': [{'student_id': 1, 'is_present_morning': True, 'is_present_afternoon': True}],
+    })
+    assert response.status_code == 200
+    assert databases and set(databases) == {'primary.db'}
+
+
+def test_reads_after_a_write_stay_on_primary(client, databases):
+    with app.test_request_context():
+        g.db_read_replica = True
+        db.session.execute(select(Event.id).limit(1)).all()
+        db.session.execute(insert(GeneralMessage).values(school_id=1, title='Routing', description='', type=99))
+        db.session.execute(select(GeneralMessage.id).where(GeneralMessage.type == 99)).one()
+        db.session.rollback()
+    assert databases == ['replica.db', 'primary.db', 'primary.db']